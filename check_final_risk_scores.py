@@ -12,23 +12,20 @@ try:
         risk_count = result.fetchone()[0]
         print(f"Risk scores calculated: {risk_count:,}")
         
-        # Check risk score distribution
+        # Check risk score distribution (each line is formatted by the server)
         result = conn.execute(sa.text("""
             SELECT 
                 risk_category,
-                COUNT(*) as count,
-                AVG(score) as avg_score,
-                MIN(score) as min_score,
-                MAX(score) as max_score
+                to_char(COUNT(*), 'FM999,999,999,990') || ' firms (avg: ' || ROUND(AVG(score), 1)
+                    || ', range: ' || MIN(score) || '-' || MAX(score) || ')' AS line
             FROM ia_risk_score 
             GROUP BY risk_category 
-            ORDER BY avg_score DESC
+            ORDER BY AVG(score) DESC
         """))
         
         print(f"\nRisk Score Distribution:")
-        for row in result:
-            category, count, avg_score, min_score, max_score = row
-            print(f"  {category}: {count:,} firms (avg: {avg_score:.1f}, range: {min_score}-{max_score})")
+        for category, line in result:
+            print(f"  {category}: {line}")
         
         # Check top 10 highest risk firms
         result = conn.execute(sa.text("""
@@ -7,19 +7,14 @@ engine = sa.create_engine(dsn, connect_args={"sslmode": "disable"})
 
 try:
     with engine.connect() as conn:
-        # Check ia_change table
-        result = conn.execute(sa.text("SELECT COUNT(*) FROM ia_change"))
-        ia_change_count = result.fetchone()[0]
+        # Count all three tables in one round trip
+        ia_change_count, ia_risk_score_count, ia_filing_count = conn.execute(sa.text("""
+            SELECT (SELECT COUNT(*) FROM ia_change),
+                   (SELECT COUNT(*) FROM ia_risk_score),
+                   (SELECT COUNT(*) FROM ia_filing)
+        """)).one()
         print(f"📊 ia_change records: {ia_change_count}")
-        
-        # Check ia_risk_score table
-        result = conn.execute(sa.text("SELECT COUNT(*) FROM ia_risk_score"))
-        ia_risk_score_count = result.fetchone()[0]
         print(f"📊 ia_risk_score records: {ia_risk_score_count}")
-        
-        # Check ia_filing table
-        result = conn.execute(sa.text("SELECT COUNT(*) FROM ia_filing"))
-        ia_filing_count = result.fetchone()[0]
         print(f"📊 ia_filing records: {ia_filing_count}")
         
         # Check if ia_change has data
@@ -3,9 +3,88 @@
 Examine the structure of extracted SEC IAPD data files
 """
 import os
+import zipfile
+import xml.etree.ElementTree as ET
 from pathlib import Path
 import pandas as pd
 
+# SpreadsheetML namespace used by every element in the sheet and shared-string parts
+XLSX_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+
+def _column_index(ref):
+    """Zero-based column index of a cell reference like 'AB12'"""
+    index = 0
+    for ch in ref:
+        if not ch.isalpha():
+            break
+        index = index * 26 + ord(ch.upper()) - 64
+    return index - 1
+
+def _shared_strings(zf, count):
+    """Return the first *count* entries of the workbook's shared-string table"""
+    strings = []
+    if count <= 0 or "xl/sharedStrings.xml" not in zf.namelist():
+        return strings
+    with zf.open("xl/sharedStrings.xml") as fh:
+        for _, el in ET.iterparse(fh):
+            if el.tag == XLSX_NS + "si":
+                # Rich text splits one string across several <t> runs
+                strings.append("".join(t.text or "" for t in el.iter(XLSX_NS + "t")))
+                el.clear()
+                if len(strings) >= count:
+                    break
+    return strings
+
+def _cell_value(kind, value, strings):
+    if value is None:
+        return None
+    if kind == "s":
+        return strings[int(value)]
+    if kind == "b":
+        return value == "1"
+    if kind in (None, "n"):
+        number = float(value)
+        return int(number) if number.is_integer() else number
+    return value
+
+def preview_xlsx(file_path, nrows):
+    """Header plus the first *nrows* rows of the first sheet, streaming only that much XML
+
+    pd.read_excel(nrows=...) still loads the whole shared-string table (and openpyxl's
+    workbook model) before honouring nrows; this stops reading each part as soon as it
+    has what the preview needs.
+    """
+    rows = []
+    with zipfile.ZipFile(file_path) as zf:
+        sheet = min(n for n in zf.namelist() if n.startswith("xl/worksheets/sheet"))
+        with zf.open(sheet) as fh:
+            for _, el in ET.iterparse(fh):
+                if el.tag != XLSX_NS + "row":
+                    continue
+                cells, position = {}, -1
+                for c in el.iter(XLSX_NS + "c"):
+                    ref = c.get("r")
+                    position = _column_index(ref) if ref else position + 1
+                    kind = c.get("t")
+                    if kind == "inlineStr":
+                        value = "".join(t.text or "" for t in c.iter(XLSX_NS + "t"))
+                    else:
+                        value = c.findtext(XLSX_NS + "v")
+                    cells[position] = (kind, value)
+                rows.append(cells)
+                el.clear()
+                if len(rows) > nrows:
+                    break
+        # Only the shared strings these rows reference are read
+        needed = [int(v) + 1 for cells in rows for kind, v in cells.values() if kind == "s" and v is not None]
+        strings = _shared_strings(zf, max(needed, default=0))
+
+    width = max((max(cells, default=-1) + 1 for cells in rows), default=0)
+    table = [[_cell_value(*cells.get(i, (None, None)), strings) for i in range(width)] for cells in rows]
+    if not table:
+        return pd.DataFrame()
+    return pd.DataFrame(table[1:], columns=table[0])
+
 def examine_data_structure():
     data_dir = Path("data/unzipped/iapd")
     
@@ -23,7 +102,7 @@ def examine_data_structure():
     for file_path in excel_files:
         try:
             print(f"\nFile: {file_path.name}")
-            df = pd.read_excel(file_path, nrows=5)  # Read first 5 rows
+            df = preview_xlsx(file_path, nrows=5)  # Read first 5 rows
             print(f"Shape: {df.shape}")
             
             # Look for CRD and SEC number columns
@@ -65,7 +65,7 @@ try:
         result = conn.execute(sa.text("""
             SELECT 
                 COUNT(*) as total_risk_scores,
-                COUNT(CASE WHEN rs.factors::text LIKE '%disciplinary_risk%' THEN 1 END) as with_disciplinary_factor
+                COUNT(CASE WHEN rs.factors ? 'disciplinary_risk' THEN 1 END) as with_disciplinary_factor
             FROM ia_risk_score rs
         """))
         
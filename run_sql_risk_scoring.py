@@ -12,19 +12,18 @@ connect_args = {"sslmode": "disable"}
 
 engine = sa.create_engine(dsn, connect_args=connect_args)
 
-def run_sql_file(filename):
-    """Run a SQL file and return the results"""
+def run_sql_file(conn, filename):
+    """Run a SQL file in its own transaction on *conn* and report success"""
     print(f"📄 Running {filename}...")
     
     try:
         with open(filename, 'r') as file:
             sql_content = file.read()
         
-        with engine.connect() as conn:
-            result = conn.execute(sa.text(sql_content))
-            conn.commit()
-            print(f"✅ {filename} completed successfully")
-            return True
+        with conn.begin():
+            conn.execute(sa.text(sql_content))
+        print(f"✅ {filename} completed successfully")
+        return True
             
     except Exception as e:
         print(f"❌ Error running {filename}: {e}")
@@ -34,44 +33,53 @@ def main():
     print("🚀 Starting SQL-based Risk Scoring Process")
     print("=" * 60)
     
-    # Step 1: Populate ia_change table
-    print("\n1️⃣ Step 1: Populating ia_change table...")
-    success1 = run_sql_file('scripts/populate_ia_change.sql')
-    
-    if not success1:
-        print("❌ Failed to populate ia_change table. Stopping.")
-        return
-    
-    # Step 2: Create/update risk scoring procedure
-    print("\n2️⃣ Step 2: Setting up risk scoring procedure...")
-    success2 = run_sql_file('scripts/risk_score_procedure_fixed.sql')
-    
-    if not success2:
-        print("❌ Failed to set up risk scoring procedure. Stopping.")
-        return
-    
-    # Step 3: Run the risk scoring procedure
-    print("\n3️⃣ Step 3: Calculating risk scores...")
-    try:
-        with engine.connect() as conn:
-            result = conn.execute(sa.text("CALL calc_risk_scores()"))
-            conn.commit()
+    # Every step shares one connection instead of opening one per step
+    with engine.connect() as conn:
+        # Step 1: Populate ia_change table
+        print("\n1️⃣ Step 1: Populating ia_change table...")
+        success1 = run_sql_file(conn, 'scripts/populate_ia_change.sql')
+        
+        if not success1:
+            print("❌ Failed to populate ia_change table. Stopping.")
+            return
+        
+        # Step 2: Create/update risk scoring procedure
+        print("\n2️⃣ Step 2: Setting up risk scoring procedure...")
+        success2 = run_sql_file(conn, 'scripts/risk_score_procedure_fixed.sql')
+        
+        if not success2:
+            print("❌ Failed to set up risk scoring procedure. Stopping.")
+            return
+        
+        # Step 3: Run the risk scoring procedure
+        print("\n3️⃣ Step 3: Calculating risk scores...")
+        try:
+            with conn.begin():
+                conn.execute(sa.text("CALL calc_risk_scores()"))
             print("✅ Risk scores calculated successfully")
-    except Exception as e:
-        print(f"❌ Error calculating risk scores: {e}")
-        return
-    
-    # Step 4: Show results
-    print("\n4️⃣ Step 4: Risk Scoring Results")
-    print("=" * 60)
-    
-    try:
-        with engine.connect() as conn:
-            # Get risk statistics
-            result = conn.execute(sa.text("SELECT * FROM get_risk_statistics()"))
+        except Exception as e:
+            print(f"❌ Error calculating risk scores: {e}")
+            return
+        
+        # Step 4: Show results
+        print("\n4️⃣ Step 4: Risk Scoring Results")
+        print("=" * 60)
+        
+        try:
+            # Get risk statistics and the total count in one round trip (the LEFT JOIN
+            # keeps the total even when there is no distribution yet)
+            rows = conn.execute(sa.text("""
+                SELECT t.total, s.risk_category, s.firm_count, s.percentage, s.avg_score
+                FROM (SELECT COUNT(*) AS total FROM ia_risk_score) t
+                LEFT JOIN get_risk_statistics() WITH ORDINALITY
+                    AS s(risk_category, firm_count, percentage, avg_score, ord) ON true
+                ORDER BY s.ord
+            """)).fetchall()
+            total_risk_scores = rows[0].total
             print("\n📊 Risk Score Distribution:")
-            for row in result:
-                category, count, percentage, avg_score = row
+            for _, category, count, percentage, avg_score in rows:
+                if category is None:
+                    continue
                 print(f"  {category}: {count:,} firms ({percentage}%) - Avg Score: {avg_score}")
             
             # Get top 10 highest risk firms
@@ -81,13 +89,10 @@ def main():
                 sec_number, firm_name, score, category, filing_date, factors = row
                 print(f"  {firm_name or 'Unknown'}: {score} points ({category})")
             
-            # Get total counts
-            result = conn.execute(sa.text("SELECT COUNT(*) FROM ia_risk_score"))
-            total_risk_scores = result.fetchone()[0]
             print(f"\n📈 Total risk scores calculated: {total_risk_scores:,}")
             
-    except Exception as e:
-        print(f"❌ Error getting results: {e}")
+        except Exception as e:
+            print(f"❌ Error getting results: {e}")
     
     print("\n🎉 SQL-based risk scoring completed!")
 
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+_db.py – Shared SQLAlchemy engine for the diagnostic scripts.
+
+Builds the DSN from the PG* environment variables (or .env) and hands out a
+single pooled engine per process, so scripts that are imported or re-run in a
+loop reuse warm connections instead of paying connect + auth on every run.
+
+Usage
+-----
+    from _db import get_engine
+    engine = get_engine()
+
+The loaders use get_dsn_and_engine / make_engine instead, and init_worker_engine
+as their process-pool initializer (worker_engine() then returns that engine).
+"""
+import functools
+import os
+import re
+import sys
+from typing import List, Optional, Tuple
+
+import sqlalchemy as sa
+from sqlalchemy.pool import QueuePool
+
+# Load environment variables
+try:
+    from dotenv import load_dotenv
+    load_dotenv()
+except ImportError:
+    pass
+
+
+# Hosts reached without TLS: local Postgres and the docker-compose service
+LOCAL_HOSTS = frozenset({"localhost", "127.0.0.1", "postgres"})
+
+
+def ssl_mode_for(host: str) -> str:
+    """Use SSL only for remote connections (RDS), disable it for local and Docker."""
+    return "disable" if host in LOCAL_HOSTS else "require"
+
+
+# libpq TCP keepalives: dead peers are detected by the OS instead of a pre-ping
+# SELECT 1 on every pool checkout
+KEEPALIVE_ARGS = {"keepalives": 1, "keepalives_idle": 30, "keepalives_interval": 10, "keepalives_count": 3}
+
+# Recycle pooled connections before RDS/NAT idle timeouts can silently drop them
+POOL_RECYCLE_SECONDS = 1500
+
+
+def get_dsn() -> str:
+    """Build the Postgres DSN from the environment (credentials never live in source)."""
+    host = os.environ.get("PGHOST", "127.0.0.1")
+    port = os.environ.get("PGPORT", "5432")
+    user = os.environ.get("PGUSER", "iapdadmin")
+    pwd = os.environ.get("PGPASSWORD", "")
+    database = os.environ.get("PGDATABASE", "iapd")
+    return f"postgresql+psycopg2://{user}:{pwd}@{host}:{port}/{database}"
+
+
+def get_dsn_and_engine() -> Tuple[str, sa.Engine]:
+    """DSN and engine for the loaders, which require every PG* variable to be set."""
+    for var in ("PGHOST", "PGDATABASE", "PGUSER", "PGPASSWORD"):
+        if not os.getenv(var):
+            sys.exit(f"Missing environment variable: {var}")
+    dsn = get_dsn()
+    return dsn, make_engine(dsn)
+
+
+@functools.lru_cache(maxsize=None)
+def make_engine(dsn: str, **kwargs) -> sa.Engine:
+    """One engine (and connection pool) per DSN and pool options in each process.
+
+    sslmode is decided here, once, from the DSN's host.
+    """
+    ssl_mode = ssl_mode_for(sa.engine.make_url(dsn).host)
+    return sa.create_engine(dsn, pool_recycle=POOL_RECYCLE_SECONDS,
+                            connect_args={"sslmode": ssl_mode, **KEEPALIVE_ARGS}, **kwargs)
+
+
+# Per-process engine for pool workers (set once by the pool initializer)
+_worker_engine: Optional[sa.Engine] = None
+
+
+def init_worker_engine(dsn: str) -> None:
+    """Pool initializer: build the worker's engine once from the DSN string.
+
+    Only the DSN crosses the process boundary; the engine is never pickled or
+    shared over fork with the parent.
+    """
+    global _worker_engine
+    _worker_engine = make_engine(dsn, pool_size=1, max_overflow=0)
+
+
+def worker_engine() -> Optional[sa.Engine]:
+    """The engine built by init_worker_engine in this process (None outside a pool worker)."""
+    return _worker_engine
+
+
+# Tokens that can hide a ';' (dollar-quoted bodies, string literals, line comments) or end a statement
+_SQL_TOKEN_RE = re.compile(r"\$(\w*)\$.*?\$\1\$|'(?:[^']|'')*'|--[^\n]*|;", re.S)
+
+# Line comments, stripped to tell comment-only fragments from real statements
+_SQL_COMMENT_RE = re.compile(r"--[^\n]*")
+
+
+def split_sql_statements(sql: str) -> List[str]:
+    """Split a SQL script on top-level semicolons (DO $$ ... $$ bodies stay whole)."""
+    statements, start = [], 0
+    for match in _SQL_TOKEN_RE.finditer(sql):
+        if match.group(0) == ";":
+            statements.append(sql[start:match.start()])
+            start = match.end()
+    statements.append(sql[start:])
+    # Drop fragments that are only whitespace and comments
+    return [stmt.strip() for stmt in statements
+            if _SQL_COMMENT_RE.sub("", stmt).strip()]
+
+
+@functools.lru_cache(maxsize=1)
+def get_engine() -> sa.Engine:
+    """Return the process-wide pooled engine, creating it on first use."""
+    return sa.create_engine(
+        get_dsn(),
+        connect_args={"sslmode": ssl_mode_for(os.environ.get("PGHOST", "127.0.0.1")), **KEEPALIVE_ARGS},
+        poolclass=QueuePool,
+        pool_size=5,
+        max_overflow=10,
+        pool_recycle=POOL_RECYCLE_SECONDS,
+        pool_use_lifo=True,
+        # psycopg2 fast-execution helpers for any executemany/bulk paths
+        executemany_mode="values_plus_batch",
+        insertmanyvalues_page_size=1000,
+        use_native_hstore=False,
+    )
@@ -0,0 +1,468 @@
+#!/usr/bin/env python3
+"""
+_pipeline.py – Streaming helpers shared by the IAPD loaders.
+
+* iter_csv_chunks – parse a CSV into bounded DataFrame chunks (PyArrow's
+  streaming reader when installed, pandas' chunked C parser otherwise or when
+  Arrow rejects the file up front).
+* prefetch        – run a chunk iterator on a background thread so parsing
+  overlaps with the COPY of the previous chunk.
+* copy_columns    – COPY a dict of column arrays into Postgres, serialised by
+  Arrow's CSV writer (no intermediate DataFrame) when PyArrow is installed.
+* normalize_columns – map one raw IAPD chunk (CSV or Excel) onto the ia_filing
+  columns, as a dict of column arrays ready for copy_columns.
+* STAGE_DDL / upsert_stage – the session-local ia_filing_stage table the loaders
+  COPY into, and the upsert that moves its rows into ia_filing.
+* ingest_chunks   – normalise, stage and upsert one file's chunks in a single
+  transaction.
+
+Usage
+-----
+    from _pipeline import iter_csv_chunks, prefetch
+    for df in prefetch(iter_csv_chunks(path, ",", "latin1")):
+        ...
+"""
+from __future__ import annotations
+
+import csv
+import functools
+import io
+import queue
+import re
+import threading
+from pathlib import Path
+from typing import (TYPE_CHECKING, Any, BinaryIO, Callable, Dict, FrozenSet, Iterable, Iterator, List,
+                    Optional, Tuple, TypeVar, Union)
+
+import numpy as np
+from numpy.typing import ArrayLike
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pa_csv
+except ImportError:  # pandas' C parser is the fallback
+    pa = pc = pa_csv = None
+
+if TYPE_CHECKING:
+    import sqlalchemy as sa
+
+# Arrow-backed strings whose .str methods run as vectorised UTF-8 kernels (if pyarrow is installed)
+STRING_DTYPE = pd.StringDtype("pyarrow") if pa is not None else pd.StringDtype()
+
+# Copy-on-Write lets column selections share the reader's buffers instead of copying
+# (always on from pandas 3, where the option is deprecated)
+if int(pd.__version__.split(".")[0]) < 3:
+    pd.set_option("mode.copy_on_write", True)
+
+T = TypeVar("T")
+
+CSV_BATCH_ROWS = 100_000            # rows per chunk on the pandas path
+CSV_BLOCK_BYTES = 16 * 1024 * 1024  # bytes per record batch on the PyArrow path
+
+# ia_filing column -> IAPD source column
+FIELD_MAPPING = {
+    'sec_number': 'SEC#',
+    'crd_number': 'Organization CRD#',
+    'firm_name': 'Primary Business Name',
+    'legal_name': 'Legal Name',
+    'sec_region': 'SEC Region',
+    'sec_status': 'SEC Current Status',
+    'sec_status_date': 'SEC Status Effective Date',
+    'raum': '5F(2)(c)',  # Regulatory Assets Under Management
+    # Client count will be calculated by summing 5D fields
+    'account_count': '5F(2)(f)',  # Number of accounts
+    'cco_name': 'Chief Compliance Officer Name',
+    'cco_phone': 'Chief Compliance Officer Telephone',
+    'cco_email': 'Chief Compliance Officer E-mail',
+    'firm_type': 'Firm Type',
+    'umbrella_registration': 'Umbrella Registration',
+    'website': 'Website Address',
+    'main_office_city': 'Main Office City',
+    'main_office_state': 'Main Office State',
+    'main_office_country': 'Main Office Country',
+}
+
+# Mapped fields parsed as numbers (everything else in FIELD_MAPPING stays text)
+NUMERIC_FIELDS = ('raum', 'account_count')
+
+# Item 5.D client counts (5D(a)(1) through 5D(n)(1)), summed into client_count
+CLIENT_COLUMNS = tuple(f'5D({letter})(1)' for letter in 'abcdefghijklmn')
+
+# Low-cardinality text fields held as categoricals (each distinct string stored once)
+CATEGORY_FIELDS = ('sec_region', 'sec_status', 'firm_type', 'main_office_state', 'main_office_country')
+
+# Picks a header's Section 11 disclosure count columns, or returns None when the single
+# '11' Y/N indicator column should be used instead
+Section11Rule = Callable[[pd.Index], Optional[List[str]]]
+
+# Filename date pattern: iaMMDDYYYY or iaMMDDYY (4-digit year tried first, otherwise
+# 'ia07012025' would be read as MMDDYY = 2020-07-01)
+_FILING_RE = re.compile(r'ia(\d{2})(\d{2})(\d{4}|\d{2})')
+
+_DONE = object()
+
+
+def csv_header(first_line: bytes, sep: str, encoding: str) -> List[str]:
+    """Split a raw CSV header line into column names."""
+    text = first_line.decode("utf-8-sig" if encoding == "utf-8" else encoding).rstrip("\r\n")
+    return next(csv.reader([text], delimiter=sep))
+
+
+def iter_csv_chunks(
+    source: Union[Path, BinaryIO],
+    sep: str,
+    encoding: str,
+    skip_bad_lines: bool = False,
+) -> Iterator[pd.DataFrame]:
+    """Yield *source* as DataFrame chunks; memory stays O(chunk).
+
+    Every column is read as a string: numeric fields are converted later by
+    to_float64, which turns a malformed cell into NaN instead of failing the file.
+    """
+    if pa_csv is None:
+        yield from _iter_pandas_chunks(source, sep, encoding, skip_bad_lines)
+        return
+
+    started = False
+    try:
+        for chunk in _iter_arrow_chunks(source, sep, encoding, skip_bad_lines):
+            started = True
+            yield chunk
+    except pa.ArrowInvalid:
+        # Arrow is stricter than pandas (e.g. ragged quoting); if nothing has been
+        # emitted yet, re-read the whole file with pandas' C parser instead
+        if started:
+            raise
+        if not isinstance(source, Path):
+            source.seek(0)
+        yield from _iter_pandas_chunks(source, sep, encoding, skip_bad_lines)
+
+
+def _iter_pandas_chunks(source, sep, encoding, skip_bad_lines) -> Iterator[pd.DataFrame]:
+    with pd.read_csv(
+        source, sep=sep, encoding=encoding, dtype=str, chunksize=CSV_BATCH_ROWS,
+        on_bad_lines="skip" if skip_bad_lines else "error",
+    ) as reader:
+        yield from reader
+
+
+def _iter_arrow_chunks(source, sep, encoding, skip_bad_lines) -> Iterator[pd.DataFrame]:
+    if isinstance(source, Path):
+        with source.open("rb") as f:
+            first_line = f.readline()
+    else:
+        first_line = source.readline()
+        source.seek(0)
+    names = csv_header(first_line, sep, encoding)
+
+    # Every column is read as text rather than inferred (or declared numeric): Arrow
+    # converts per block, so a late non-numeric cell would otherwise abort the stream
+    # after earlier chunks have already been COPYed.
+    reader = pa_csv.open_csv(
+        str(source) if isinstance(source, Path) else source,
+        read_options=pa_csv.ReadOptions(
+            encoding=encoding, column_names=names, skip_rows=1, block_size=CSV_BLOCK_BYTES,
+        ),
+        parse_options=pa_csv.ParseOptions(
+            delimiter=sep,
+            newlines_in_values=True,
+            invalid_row_handler=(lambda row: "skip") if skip_bad_lines else None,
+        ),
+        convert_options=pa_csv.ConvertOptions(
+            column_types={name: pa.string() for name in names},
+            strings_can_be_null=True,
+        ),
+    )
+    for batch in reader:
+        yield batch.to_pandas()
+
+
+def copy_columns(cur, table: str, data: Dict[str, Any]) -> None:
+    """COPY equal-length column arrays in *data* into *table* (column names = keys)."""
+    columns = ", ".join(f'"{c}"' for c in data)
+    if pa_csv is not None:
+        try:
+            arrow = pa.table({name: pa.array(values, from_pandas=True) for name, values in data.items()})
+            buf = io.BytesIO()
+            pa_csv.write_csv(arrow, buf, write_options=pa_csv.WriteOptions(include_header=False))
+        except pa.ArrowException:
+            pass  # e.g. an Excel column mixing numbers and text: let pandas stringify it
+        else:
+            # Arrow writes NULL as an unquoted empty field (COPY's CSV default) and
+            # quotes every string, so empty strings stay distinct from NULL
+            buf.seek(0)
+            cur.copy_expert(f"COPY {table} ({columns}) FROM STDIN WITH (FORMAT CSV)", buf)
+            return
+
+    text = io.StringIO()
+    pd.DataFrame(data, copy=False).to_csv(text, index=False, header=False, na_rep="\\N")
+    text.seek(0)
+    cur.copy_expert(f"COPY {table} ({columns}) FROM STDIN WITH (FORMAT CSV, NULL '\\N')", text)
+
+
+@functools.lru_cache(maxsize=256)
+def extract_filing_date(filename: str) -> Optional[str]:
+    """Filing date from a filename like 'ia010220.xlsx' -> '2020-01-02' (cached per file)."""
+    match = _FILING_RE.search(filename)
+    if not match:
+        return None
+    month, day, year = match.groups()
+    if len(year) == 2:
+        # Convert 2-digit year to 4-digit (assuming 20xx for years 20-99, 19xx for 00-19)
+        year = f"20{year}" if int(year) >= 20 else f"19{year}"
+    return f"{year}-{month}-{day}"
+
+
+# A plain decimal or scientific-notation number (after trimming whitespace)
+_NUMBER_PATTERN = r'^[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?$'
+
+
+def to_float64(values) -> np.ndarray:
+    """float64 array of a column; text cells that don't parse as numbers become NaN.
+
+    Arrow-backed text (what the CSV readers produce) is parsed by Arrow kernels: cells
+    that aren't numbers are nulled before the cast, so one bad cell can't fail it.
+    Anything else, such as Excel's mixed object cells, goes through pd.to_numeric.
+    """
+    series = values if isinstance(values, pd.Series) else pd.Series(values, copy=False)
+    if pc is not None and isinstance(series.dtype, pd.StringDtype) and series.dtype.storage == 'pyarrow':
+        text = pc.utf8_trim_whitespace(pa.array(series))
+        numbers = pc.if_else(pc.match_substring_regex(text, _NUMBER_PATTERN), text, None)
+        return pc.cast(numbers, pa.float64()).to_numpy(zero_copy_only=False)
+    return pd.to_numeric(series, errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+
+
+def sum_numeric_columns(df: pd.DataFrame, columns: List[str]) -> np.ndarray:
+    """Per-row sum of *columns* as int64 (NaN / unparseable cells count as 0)."""
+    values = np.column_stack([to_float64(df[col]) for col in columns])
+    return np.nansum(values, axis=1).round().astype(np.int64)
+
+
+def count_array(values: np.ndarray) -> pd.arrays.IntegerArray:
+    """Counts as nullable Int64 for an INTEGER column (COPY rejects "12.0"). Negative
+    counts are invalid source data and become NULL, like unparseable cells."""
+    values = np.round(values.astype(np.float64, copy=False))
+    return pd.array(np.where(values < 0, np.nan, values), dtype='Int64')
+
+
+def clean_text(series: pd.Series) -> pd.Series:
+    """Strip identifier strings without a Python-level pass (missing values stay NA)."""
+    if series.dtype != STRING_DTYPE:
+        series = series.astype(STRING_DTYPE)
+    return series.str.strip()
+
+
+def count_disciplinary_disclosures(df: pd.DataFrame, section_11_cols: Optional[List[str]]) -> np.ndarray:
+    """Section 11 disclosures per row: the '11' Y/N indicator when *section_11_cols* is
+    None, otherwise the sum of those count columns."""
+    if section_11_cols is None:
+        # Convert Y/N to 1/0 with one NumPy compare (no intermediate bool Series)
+        return (df['11'].to_numpy() == 'Y').astype(np.int64)
+    if section_11_cols:
+        return sum_numeric_columns(df, section_11_cols)
+    return np.zeros(len(df), dtype=np.int64)
+
+
+@functools.lru_cache(maxsize=64)
+def plan_columns(columns: Tuple[str, ...], section_11_rule: Section11Rule
+                 ) -> Tuple[Tuple[Tuple[str, Optional[str]], ...], List[str], Optional[List[str]], FrozenSet[str]]:
+    """Resolve source columns once per distinct header: every chunk of a file (and most
+    files of a release) share it, so the lookups and Section 11 scan are reused.
+
+    Returns (db_field, source column or None) pairs, the 5D client columns, the
+    Section 11 columns and the mapped fields this header lacks.
+    """
+    cols = frozenset(columns)
+    sources = tuple((db_field, source_field if source_field in cols else None)
+                    for db_field, source_field in FIELD_MAPPING.items())
+    client_columns = [col_name for col_name in CLIENT_COLUMNS if col_name in cols]
+    missing = frozenset(db_field for db_field, source_field in sources if source_field is None)
+    return sources, client_columns, section_11_rule(pd.Index(columns)), missing
+
+
+def normalize_columns(df: pd.DataFrame, filename: str, section_11_rule: Section11Rule) -> Dict[str, ArrayLike]:
+    """Normalize one chunk to the ia_filing schema as a dict of column arrays."""
+    # Readers already produce string headers; only rebuild the Index if one slipped through
+    if df.columns.inferred_type != 'string':
+        df.columns = df.columns.astype(str)
+    sources, client_columns, section_11_cols, missing = plan_columns(tuple(df.columns), section_11_rule)
+    
+    # Keep only rows with a SEC number, selected once on the source frame up front
+    # rather than by a dropna() copy of the finished output
+    sec_source = dict(sources)['sec_number']  # None when the header has no SEC# column
+    if sec_source is None:
+        df = df.iloc[:0]
+    else:
+        has_sec = df[sec_source].notna().to_numpy()
+        if not has_sec.all():
+            df = df[has_sec]
+    
+    n = len(df)
+    
+    # Collect output columns in a dict; COPY serialises it directly, so no output
+    # DataFrame (and its block consolidation) is ever built
+    data = {}
+    
+    # Map fields from the source data; fields this header lacks (*missing*) are
+    # all-NULL and skip the per-type conversions below
+    for db_field, source_field in sources:
+        if db_field in NUMERIC_FIELDS:
+            # Parsed from the source Series itself, so Arrow-backed text is parsed by Arrow
+            data[db_field] = (to_float64(df[source_field]) if source_field is not None
+                              else np.full(n, np.nan))
+        elif source_field is not None:
+            data[db_field] = df[source_field].to_numpy()
+        else:
+            data[db_field] = np.full(n, None, dtype=object)
+    
+    # Extract filing date from filename
+    filing_date = extract_filing_date(filename)
+    if filing_date:
+        data['filing_date'] = np.full(n, filing_date, dtype='datetime64[D]')
+    
+    # Calculate client count by summing 5D fields (5D(a)(1) through 5D(n)(1))
+    if client_columns:
+        data['client_count'] = count_array(sum_numeric_columns(df, client_columns))
+    else:
+        data['client_count'] = np.zeros(n, dtype=np.int64)
+    
+    data['account_count'] = count_array(data['account_count'])
+    
+    # Convert boolean fields
+    # Vectorised Y/Yes -> True, N/No -> False, anything else -> NULL (no per-row dict lookup),
+    # held as a nullable boolean array (bool values + mask) instead of Python objects
+    if 'umbrella_registration' not in missing:
+        umbrella = data['umbrella_registration']
+        is_yes = np.isin(umbrella, ['Y', 'Yes'])
+        is_no = np.isin(umbrella, ['N', 'No'])
+        data['umbrella_registration'] = pd.arrays.BooleanArray(is_yes, ~(is_yes | is_no))
+    
+    # Count disciplinary disclosures (Section 11)
+    data['disciplinary_disclosures'] = count_disciplinary_disclosures(df, section_11_cols)
+    
+    # CCO contact fields as (Arrow-backed) string arrays rather than per-row Python objects
+    for field in ('cco_name', 'cco_phone', 'cco_email'):
+        if field not in missing:
+            data[field] = pd.array(data[field], dtype=STRING_DTYPE)
+    
+    # Region/status/state codes repeat across every row: categorical codes keep memory
+    # small and let to_csv format each distinct value once for COPY
+    for field in CATEGORY_FIELDS:
+        if field not in missing:
+            data[field] = pd.Categorical(data[field])
+    
+    # Clean up SEC number format
+    data['sec_number'] = clean_text(pd.Series(data['sec_number'])).array
+    
+    # Clean up CRD number format (keep as string to preserve leading zeros)
+    data['crd_number'] = clean_text(pd.Series(data['crd_number'])).array
+    
+    return data
+
+
+# Session-local staging table: TEMP tables are never WAL-logged, and each pool worker
+# gets its own, so concurrent files don't collide. Rows are cleared on every commit.
+STAGE_DDL = (
+    "CREATE TEMP TABLE IF NOT EXISTS ia_filing_stage "
+    "(LIKE ia_filing INCLUDING DEFAULTS) ON COMMIT DELETE ROWS"
+)
+
+
+def upsert_stage(cur, columns: List[str]) -> int:
+    """Upsert ia_filing_stage into ia_filing on (sec_number, filing_date); return the row count."""
+    col_list = ", ".join(f'"{c}"' for c in columns)
+    updates = ", ".join(f'"{c}" = EXCLUDED."{c}"' for c in columns if c not in ("sec_number", "filing_date"))
+    # DISTINCT ON: ON CONFLICT cannot touch the same target row twice in one statement
+    cur.execute(
+        f"INSERT INTO ia_filing ({col_list}) "
+        f"SELECT DISTINCT ON (sec_number, filing_date) {col_list} FROM ia_filing_stage "
+        f"ORDER BY sec_number, filing_date "
+        f"ON CONFLICT (sec_number, filing_date) DO UPDATE SET {updates}, updated_at = CURRENT_TIMESTAMP"
+    )
+    return cur.rowcount
+
+
+def ingest_chunks(name: str, chunks: Iterable[pd.DataFrame], engine: "sa.Engine",
+                  section_11_rule: Section11Rule) -> str:
+    """Normalise, stage and upsert one file's chunks (one transaction per file); return a
+    one-line status for the file."""
+    try:
+        loaded = 0
+        columns = None
+        raw = engine.raw_connection()
+        try:
+            with raw.cursor() as cur:
+                # The temp stage lives as long as the pooled connection: create it once
+                if not raw.info.get("ia_filing_stage"):
+                    cur.execute(STAGE_DDL)
+                # Don't wait for a WAL flush on each file's commit; a crash can only lose
+                # the last few files, and re-running the load upserts them again
+                cur.execute("SET LOCAL synchronous_commit TO OFF")
+                # Parse the next chunk on a helper thread while this one is COPYed
+                for df in prefetch(chunks):
+                    clean = normalize_columns(df, name, section_11_rule)
+                    # Release the source chunk (hundreds of unused columns) before COPY
+                    del df
+                    
+                    # normalize_columns has already dropped rows without SEC numbers
+                    if len(clean['sec_number']) == 0:
+                        continue
+                    
+                    copy_columns(cur, "ia_filing_stage", clean)
+                    columns = list(clean)
+                
+                # Re-ingesting a file updates its filings instead of duplicating them
+                if columns:
+                    loaded = upsert_stage(cur, columns)
+            raw.commit()
+            # Only mark the stage as created once its DDL has committed
+            raw.info["ia_filing_stage"] = True
+        finally:
+            raw.close()
+        
+        if loaded == 0:
+            return f"· {name}: No valid SEC numbers found"
+        return f"✓ {name}: {loaded} rows loaded"
+    except Exception as e:
+        return f"✗ {name}: {e}"
+
+
+def prefetch(items: Iterable[T], depth: int = 2) -> Iterator[T]:
+    """Produce *items* on a background thread, keeping at most *depth* ready."""
+    q: queue.Queue = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce() -> None:
+        try:
+            for item in items:
+                if not put(item):
+                    return
+        except BaseException as exc:  # re-raised in the consumer
+            put(exc)
+            return
+        put(_DONE)
+
+    worker = threading.Thread(target=produce, daemon=True)
+    worker.start()
+    try:
+        while True:
+            item = q.get()
+            if item is _DONE:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        worker.join()
@@ -30,6 +30,9 @@ import pandas as pd
 import sqlalchemy as sa
 from sqlalchemy import text
 
+from _db import KEEPALIVE_ARGS
+from _pipeline import copy_columns
+
 # Load environment variables
 try:
     from dotenv import load_dotenv
@@ -69,7 +72,8 @@ def get_database_connection() -> sa.Engine:
     db = os.environ["PGDATABASE"]
     
     dsn = f"postgresql+psycopg2://{user}:{pwd}@{host}:{port}/{db}"
-    return sa.create_engine(dsn, pool_pre_ping=True, connect_args={"sslmode": "require"})
+    # Keepalives instead of pool_pre_ping: a one-shot run doesn't need a SELECT 1 per checkout
+    return sa.create_engine(dsn, connect_args={"sslmode": "require", **KEEPALIVE_ARGS})
 
 def create_risk_scores_table(engine: sa.Engine) -> None:
     """Create the risk_scores table if it doesn't exist."""
@@ -98,6 +102,11 @@ def create_risk_scores_table(engine: sa.Engine) -> None:
     with engine.begin() as conn:
         conn.execute(text(create_sql))
 
+def copy_frame(conn: sa.Connection, table: str, df: pd.DataFrame) -> None:
+    """Bulk load *df* into *table* with COPY FROM STDIN inside *conn*'s transaction."""
+    with conn.connection.cursor() as cur:
+        copy_columns(cur, table, {name: df[name] for name in df.columns})
+
 def calculate_disclosure_risk(df: pd.DataFrame) -> Tuple[pd.Series, Dict]:
     """Calculate risk based on regulatory disclosures."""
     # Group by CRD to get disclosure history
@@ -136,39 +145,32 @@ def calculate_aum_volatility_risk(df: pd.DataFrame) -> Tuple[pd.Series, Dict]:
     # Get AUM data for each firm over time
     aum_data = df[['crd', 'filing_date', 'raum']].dropna()
     aum_data['filing_date'] = pd.to_datetime(aum_data['filing_date'])
+    firms = aum_data['crd'].unique()
     
-    # Calculate AUM volatility for each firm
-    aum_volatility = []
-    risk_factors = {}
+    # Sort once by firm and date, then compute every firm's changes in one grouped pass
+    # (no per-firm boolean mask over the whole frame)
+    aum_data = aum_data.sort_values(['crd', 'filing_date'], kind='stable')
+    by_firm = aum_data.groupby('crd', sort=False)
     
-    for crd in aum_data['crd'].unique():
-        firm_aum = aum_data[aum_data['crd'] == crd].sort_values('filing_date')
-        
-        if len(firm_aum) < 2:
-            aum_volatility.append(0.0)
-            risk_factors[crd] = {'aum_volatility': 0.0, 'aum_trend': 0.0}
-            continue
-        
-        # Calculate percentage changes
-        firm_aum['aum_change'] = firm_aum['raum'].pct_change()
-        
-        # Calculate volatility (standard deviation of percentage changes)
-        volatility = firm_aum['aum_change'].std()
-        
-        # Calculate trend (positive = growing, negative = declining)
-        trend = firm_aum['aum_change'].mean()
-        
-        # Normalize volatility to 0-1 scale
-        normalized_volatility = min(volatility * 10, 1.0)  # Scale factor of 10
-        
-        aum_volatility.append(normalized_volatility)
-        risk_factors[crd] = {
-            'aum_volatility': float(volatility),
-            'aum_trend': float(trend),
-            'aum_data_points': len(firm_aum)
-        }
-    
-    return pd.Series(aum_volatility, index=aum_data['crd'].unique()), risk_factors
+    # Calculate percentage changes
+    aum_change = by_firm['raum'].pct_change()
+    
+    # Volatility (standard deviation of percentage changes) and trend
+    # (positive = growing, negative = declining) per firm
+    stats = aum_change.groupby(aum_data['crd'], sort=False).agg(['std', 'mean']).reindex(firms)
+    data_points = by_firm.size().reindex(firms)
+    
+    # Normalize volatility to 0-1 scale (scale factor of 10); firms with fewer than
+    # two filings score 0
+    aum_volatility = np.where(data_points < 2, 0.0, np.minimum(stats['std'] * 10, 1.0))
+    
+    risk_factors = {
+        crd: ({'aum_volatility': float(volatility), 'aum_trend': float(trend), 'aum_data_points': int(points)}
+              if points >= 2 else {'aum_volatility': 0.0, 'aum_trend': 0.0})
+        for crd, volatility, trend, points in zip(firms, stats['std'], stats['mean'], data_points)
+    }
+    
+    return pd.Series(aum_volatility, index=firms), risk_factors
 
 def calculate_client_concentration_risk(df: pd.DataFrame) -> Tuple[pd.Series, Dict]:
     """Calculate risk based on client concentration."""
@@ -228,36 +230,33 @@ def calculate_cco_stability_risk(df: pd.DataFrame) -> Tuple[pd.Series, Dict]:
     # Analyze CCO changes over time
     cco_data = df[['crd', 'filing_date', 'cco_id']].dropna()
     cco_data['filing_date'] = pd.to_datetime(cco_data['filing_date'])
+    firms = cco_data['crd'].unique()
     
-    cco_stability_risk = []
-    risk_factors = {}
+    # Sort once by firm and date so every firm's changes come from one grouped pass
+    cco_data = cco_data.sort_values(['crd', 'filing_date'], kind='stable')
+    by_firm = cco_data.groupby('crd', sort=False)
     
-    for crd in cco_data['crd'].unique():
-        firm_cco = cco_data[cco_data['crd'] == crd].sort_values('filing_date')
-        
-        if len(firm_cco) < 2:
-            cco_stability_risk.append(0.0)
-            risk_factors[crd] = {'cco_changes': 0, 'cco_stability_period': 0}
-            continue
-        
-        # Count CCO changes
-        cco_changes = (firm_cco['cco_id'] != firm_cco['cco_id'].shift()).sum()
-        
-        # Calculate average CCO tenure
-        years_active = (firm_cco['filing_date'].max() - firm_cco['filing_date'].min()).days / 365.25
-        avg_tenure = years_active / max(cco_changes, 1)
-        
-        # Normalize risk (more changes = higher risk)
-        stability_risk = min(cco_changes / 5.0, 1.0)  # Cap at 5 changes
-        
-        cco_stability_risk.append(stability_risk)
-        risk_factors[crd] = {
-            'cco_changes': int(cco_changes),
-            'avg_tenure_years': float(avg_tenure),
-            'years_active': float(years_active)
-        }
-    
-    return pd.Series(cco_stability_risk, index=cco_data['crd'].unique()), risk_factors
+    # Count CCO changes (a firm's first filing counts as one, as it differs from "no CCO")
+    changed = cco_data['cco_id'] != by_firm['cco_id'].shift()
+    cco_changes = changed.groupby(cco_data['crd'], sort=False).sum().reindex(firms)
+    filings = by_firm.size().reindex(firms)
+    
+    # Calculate average CCO tenure
+    dates = by_firm['filing_date'].agg(['min', 'max']).reindex(firms)
+    years_active = (dates['max'] - dates['min']).dt.days / 365.25
+    avg_tenure = years_active / cco_changes.clip(lower=1)
+    
+    # Normalize risk (more changes = higher risk, capped at 5 changes); firms with
+    # fewer than two filings score 0
+    cco_stability_risk = np.where(filings < 2, 0.0, np.minimum(cco_changes / 5.0, 1.0))
+    
+    risk_factors = {
+        crd: ({'cco_changes': int(changes), 'avg_tenure_years': float(tenure), 'years_active': float(years)}
+              if count >= 2 else {'cco_changes': 0, 'cco_stability_period': 0})
+        for crd, changes, tenure, years, count in zip(firms, cco_changes, avg_tenure, years_active, filings)
+    }
+    
+    return pd.Series(cco_stability_risk, index=firms), risk_factors
 
 def calculate_size_factor_risk(df: pd.DataFrame) -> Tuple[pd.Series, Dict]:
     """Calculate risk based on firm size considerations."""
@@ -304,6 +303,16 @@ def categorize_risk(score: float) -> str:
     else:
         return 'Low'
 
+def categorize_risk_scores(scores: pd.Series) -> np.ndarray:
+    """Vectorised categorize_risk over a Series of scores."""
+    values = scores.to_numpy(dtype=float)
+    return np.select(
+        [values >= RISK_THRESHOLDS['critical'], values >= RISK_THRESHOLDS['high'],
+         values >= RISK_THRESHOLDS['medium']],
+        ['Critical', 'High', 'Medium'],
+        default='Low',
+    )
+
 def main():
     parser = argparse.ArgumentParser(description="Calculate risk scores for investment advisers")
     parser.add_argument("--update-existing", action="store_true", help="Update existing risk scores")
@@ -363,35 +372,30 @@ def main():
     print("Calculating overall risk scores...")
     overall_risk_scores = calculate_overall_risk_score(risk_components)
     
-    # Create results DataFrame
-    results = []
-    for crd in overall_risk_scores.index:
-        risk_score = overall_risk_scores[crd]
-        risk_category = categorize_risk(risk_score)
-        
-        # Combine all risk factors for this firm
-        all_factors = {}
-        for factor_dict in [disclosure_factors, aum_factors, client_factors, 
-                           filing_factors, cco_factors, size_factors]:
+    # Create results DataFrame column-wise (no per-firm Series lookups)
+    firms = overall_risk_scores.index
+    factor_dicts = [disclosure_factors, aum_factors, client_factors,
+                    filing_factors, cco_factors, size_factors]
+    
+    # Combine all risk factors for each firm
+    all_factors = []
+    for crd in firms:
+        firm_factors = {}
+        for factor_dict in factor_dicts:
             if crd in factor_dict:
-                all_factors.update(factor_dict[crd])
-        
-        result = {
-            'crd': crd,
-            'overall_risk_score': float(risk_score),
-            'risk_category': risk_category,
-            'disclosure_risk': float(disclosure_risk.get(crd, 0)),
-            'aum_volatility_risk': float(aum_volatility_risk.get(crd, 0)),
-            'client_concentration_risk': float(client_concentration_risk.get(crd, 0)),
-            'filing_compliance_risk': float(filing_compliance_risk.get(crd, 0)),
-            'cco_stability_risk': float(cco_stability_risk.get(crd, 0)),
-            'size_factor_risk': float(size_factor_risk.get(crd, 0)),
-            'risk_factors': all_factors,
-            'last_calculation_date': datetime.now()
-        }
-        results.append(result)
-    
-    results_df = pd.DataFrame(results)
+                firm_factors.update(factor_dict[crd])
+        all_factors.append(firm_factors)
+    
+    results_df = pd.DataFrame({
+        'crd': firms,
+        'overall_risk_score': overall_risk_scores.to_numpy(dtype=float),
+        'risk_category': categorize_risk_scores(overall_risk_scores),
+        # Firms missing from a component score 0 for it
+        **{component: risk.reindex(firms, fill_value=0).to_numpy(dtype=float)
+           for component, risk in risk_components.items()},
+        'risk_factors': all_factors,
+        'last_calculation_date': datetime.now(),
+    })
     
     # Print summary statistics
     print("\nRisk Score Summary:")
@@ -419,7 +423,10 @@ def main():
         
         with engine.begin() as conn:
             temp_table = "temp_risk_scores_update"
-            update_df.to_sql(temp_table, conn, if_exists='replace', index=False, method='multi')
+            conn.execute(text(
+                f"CREATE TEMP TABLE {temp_table} (LIKE risk_scores INCLUDING DEFAULTS) ON COMMIT DROP"
+            ))
+            copy_frame(conn, temp_table, update_df)
             
             upsert_sql = f"""
             INSERT INTO risk_scores (
@@ -449,7 +456,6 @@ def main():
             """
             
             conn.execute(text(upsert_sql))
-            conn.execute(text(f"DROP TABLE {temp_table}"))
             
         print(f"Updated {len(results_df)} risk score records")
     else:
@@ -461,7 +467,8 @@ def main():
         insert_df['created_at'] = datetime.now()
         insert_df['updated_at'] = datetime.now()
         
-        insert_df.to_sql('risk_scores', engine, if_exists='append', index=False, method='multi')
+        with engine.begin() as conn:
+            copy_frame(conn, 'risk_scores', insert_df)
         print(f"Inserted {len(results_df)} new risk score records")
     
     print("Risk score calculation completed successfully! ✔")
@@ -13,6 +13,7 @@ from datetime import datetime
 import pandas as pd
 import numpy as np
 from dotenv import load_dotenv
+from psycopg2.extras import execute_values
 
 # Load environment variables
 load_dotenv()
@@ -145,33 +146,39 @@ def main():
             
             # Insert new risk scores
             if risk_scores:
-                insert_query = text("""
-                    INSERT INTO ia_risk_score 
-                    (sec_number, filing_date, score, risk_category, factors, created_at, updated_at)
-                    VALUES (:sec_number, :filing_date, :score, :risk_category, :factors, :created_at, :updated_at)
-                """)
-                
-                conn.execute(insert_query, risk_scores)
+                # execute_values sends pages of multi-row VALUES instead of one
+                # INSERT round trip per row (text() executemany isn't batched)
+                with conn.connection.cursor() as cur:
+                    execute_values(
+                        cur,
+                        """
+                        INSERT INTO ia_risk_score 
+                        (sec_number, filing_date, score, risk_category, factors, created_at, updated_at)
+                        VALUES %s
+                        """,
+                        risk_scores,
+                        template="(%(sec_number)s, %(filing_date)s, %(score)s, %(risk_category)s,"
+                                 " %(factors)s, %(created_at)s, %(updated_at)s)",
+                        page_size=10000,
+                    )
                 conn.commit()
                 print(f"💾 Saved {len(risk_scores)} risk scores to database")
             
-            # Print summary statistics
+            # Print summary statistics (each line is formatted by the server)
             summary_query = text("""
                 SELECT 
                     risk_category,
-                    COUNT(*) as count,
-                    AVG(score) as avg_score,
-                    MIN(score) as min_score,
-                    MAX(score) as max_score
+                    to_char(COUNT(*), 'FM999,999,999,990') || ' firms (avg: ' || ROUND(AVG(score), 1)
+                        || ', range: ' || MIN(score) || '-' || MAX(score) || ')' AS line
                 FROM ia_risk_score 
                 GROUP BY risk_category 
-                ORDER BY avg_score DESC
+                ORDER BY AVG(score) DESC
             """)
             
             summary_result = conn.execute(summary_query)
             print("\n📈 Risk Score Summary:")
             for row in summary_result:
-                print(f"  {row.risk_category}: {row.count:,} firms (avg: {row.avg_score:.1f}, range: {row.min_score}-{row.max_score})")
+                print(f"  {row.risk_category}: {row.line}")
             
             # Show top 10 highest risk firms
             top_risk_query = text("""
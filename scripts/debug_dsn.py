@@ -2,30 +2,30 @@
 import os
 import sqlalchemy as sa
 
-# Load environment variables
-try:
-    from dotenv import load_dotenv
-    load_dotenv()
-except ImportError:
-    pass
+from _db import get_dsn, get_engine
 
-# Build DSN
-host = os.environ.get("PGHOST", "localhost")
-port = os.environ.get("PGPORT", "5432")
-user = os.environ.get("PGUSER", "postgres")
-pwd = os.environ.get("PGPASSWORD", "")
-database = os.environ.get("PGDATABASE", "postgres")
+# Build DSN (environment is loaded by _db)
+host = os.environ.get("PGHOST", "127.0.0.1")
+user = os.environ.get("PGUSER", "iapdadmin")
+database = os.environ.get("PGDATABASE", "iapd")
 
-dsn = f"postgresql+psycopg2://{user}:{pwd}@{host}:{port}/{database}"
+dsn = get_dsn()
 
 print(f"DSN: {dsn}")
 print(f"Host: {host}")
 print(f"User: {user}")
 print(f"Database: {database}")
 
-# Try to connect with explicit SSL disable
+# Build the shared pooled engine first: create_engine validates the dialect and pool
+# arguments without a server, so a bad engine kwarg is reported apart from connect errors
+try:
+    engine = get_engine()
+    print(f"✅ Engine configured: {engine.dialect.name}+{engine.dialect.driver}, pool {type(engine.pool).__name__}")
+except Exception as e:
+    raise SystemExit(f"❌ Engine configuration failed: {e}")
+
+# Try to connect through the shared pooled engine
 try:
-    engine = sa.create_engine(dsn, connect_args={"sslmode": "disable"})
     with engine.connect() as conn:
         result = conn.execute(sa.text("SELECT 1 as test"))
         print("✅ Connection successful!")
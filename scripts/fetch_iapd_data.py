@@ -26,19 +26,22 @@ from __future__ import annotations
 
 import argparse
 import os
+import re
+import shutil
 import sys
 import time
-from datetime import datetime, timedelta
 from pathlib import Path
-from typing import List, Optional
+from typing import List
 
 import requests
 from bs4 import BeautifulSoup
 
 try:
     from tqdm import tqdm  # progress bar
+    HAVE_TQDM = True
 except ModuleNotFoundError:  # graceful fallback
     tqdm = lambda x, **_: x  # type: ignore  # noqa: E731
+    HAVE_TQDM = False
 
 # Load environment variables
 try:
@@ -55,9 +58,13 @@ HEADERS = {
     "User-Agent": "MyFirm-IAPDFetcher/1.0 (+mailto:ops@myfirm.com)",
 }
 TIMEOUT = 30  # seconds
+CHUNK_SIZE = 1024 * 1024  # 1 MiB download chunks
 
 EXCLUDE_PHRASE = "exempt reporting advisers"  # case-insensitive
 
+# iaMMDDYY.zip, iaMMDDYYYY.zip, ia-MMDDYY.zip, iaMMDDYY-2.zip, iaMMDDYY_2.zip (8 digits tried first)
+_ZIP_YEAR_RE = re.compile(r"(?:^|/)ia-?(\d{8}|\d{6})[-_]?\d*\.zip$", re.I)
+
 # Default fetch interval (24 hours) if not specified in .env
 DEFAULT_FETCH_INTERVAL_HOURS = 24
 
@@ -67,6 +74,18 @@ def get_fetch_interval() -> int:
     return int(os.getenv("DATA_FETCH_INTERVAL_HOURS", DEFAULT_FETCH_INTERVAL_HOURS))
 
 
+def _latest_zip_mtime(dest_dir: Path) -> float:
+    """Return the newest ZIP mtime in *dest_dir* (0.0 if there are none) in a single directory pass."""
+    latest = 0.0
+    with os.scandir(dest_dir) as it:
+        for entry in it:
+            if entry.name.endswith(".zip") and entry.is_file(follow_symlinks=False):
+                mtime = entry.stat().st_mtime
+                if mtime > latest:
+                    latest = mtime
+    return latest
+
+
 def should_fetch_data(dest_dir: Path) -> bool:
     """
     Check if we should fetch data based on the last fetch time.
@@ -74,25 +93,14 @@ def should_fetch_data(dest_dir: Path) -> bool:
     """
     fetch_interval_hours = get_fetch_interval()
     
-    # Check if any files exist in the destination directory
-    if not dest_dir.exists() or not any(dest_dir.glob("*.zip")):
+    # Find the most recent ZIP file's modification time
+    latest_mtime = _latest_zip_mtime(dest_dir) if dest_dir.is_dir() else 0.0
+    if latest_mtime == 0.0:
         print(f"No existing files found in {dest_dir} - will download")
         return True
     
-    # Find the most recent ZIP file
-    zip_files = list(dest_dir.glob("*.zip"))
-    if not zip_files:
-        print(f"No ZIP files found in {dest_dir} - will download")
-        return True
-    
-    # Get the most recent file's modification time
-    latest_file = max(zip_files, key=lambda f: f.stat().st_mtime)
-    latest_time = datetime.fromtimestamp(latest_file.stat().st_mtime)
-    current_time = datetime.now()
-    
-    # Calculate time difference
-    time_diff = current_time - latest_time
-    hours_since_last_fetch = time_diff.total_seconds() / 3600
+    # Calculate time difference directly in epoch seconds
+    hours_since_last_fetch = (time.time() - latest_mtime) / 3600.0
     
     if hours_since_last_fetch >= fetch_interval_hours:
         print(f"Last fetch was {hours_since_last_fetch:.1f} hours ago (threshold: {fetch_interval_hours} hours) - will download")
@@ -112,17 +120,16 @@ def discover_zip_urls() -> List[str]:
 
     for a in soup.find_all("a", href=True):
         href = a["href"].strip()
-        if not href.lower().endswith(".zip"):
+        # One regex pass: must be a Registered IA ZIP (iaMMDDYY[YY][-N].zip) from 2020 onwards
+        match = _ZIP_YEAR_RE.search(href)
+        if not match:
             continue
-        label = a.get_text(strip=True).lower()
-        if EXCLUDE_PHRASE in label:
-            continue  # skip ERA datasets
-        
-        # Extract year from filename (e.g., ia010120.zip -> 2020)
-        filename = href.split("/")[-1]
-        year = extract_year_from_filename(filename)
-        if year is None or year < 2020:
+        date_str = match.group(1)
+        year = 2000 + int(date_str[4:6]) if len(date_str) == 6 else int(date_str[4:8])
+        if year < 2020:
             continue  # skip files before 2020
+        if EXCLUDE_PHRASE in a.get_text(strip=True).lower():
+            continue  # skip ERA datasets
             
         url = href if href.startswith("http") else f"https://www.sec.gov{href}"
         zip_links.append(url)
@@ -134,21 +141,6 @@ def discover_zip_urls() -> List[str]:
     return zip_links
 
 
-def extract_year_from_filename(filename: str) -> Optional[int]:
-    """Extract year from filename like 'ia010120.zip' -> 2020, 'ia-050324.zip' -> 2024, 'ia020119-2.zip' -> 2019"""
-    import re
-    # Pattern: iaMMDDYY.zip, iaMMDDYYYY.zip, ia-MMDDYY.zip, iaMMDDYY-2.zip, iaMMDDYY_2.zip
-    match = re.search(r'ia-?(\d{6,8})[-_]?\d*\.zip', filename)
-    if match:
-        date_str = match.group(1)
-        if len(date_str) == 6:  # MMDDYY format
-            year = int('20' + date_str[4:6])
-        else:  # MMDDYYYY format
-            year = int(date_str[4:8])
-        return year
-    return None
-
-
 def download(url: str, dest: Path) -> None:
     """Stream *url* into *dest* unless the file already exists."""
     dest.parent.mkdir(parents=True, exist_ok=True)
@@ -161,6 +153,12 @@ def download(url: str, dest: Path) -> None:
         r.raise_for_status()
         total = int(r.headers.get("content-length", 0))
         print(f"↓ {dest.name} …")
+        if not HAVE_TQDM:
+            # No progress bar to feed – let shutil do the copy loop in C
+            r.raw.decode_content = True
+            with dest.open("wb") as f:
+                shutil.copyfileobj(r.raw, f, length=CHUNK_SIZE)
+            return
         with dest.open("wb") as f, tqdm(
             total=total,
             unit="B",
@@ -168,7 +166,7 @@ def download(url: str, dest: Path) -> None:
             unit_divisor=1024,
             desc=dest.name,
         ) as bar:
-            for chunk in r.iter_content(chunk_size=1024 * 32):
+            for chunk in r.iter_content(chunk_size=CHUNK_SIZE):
                 f.write(chunk)
                 bar.update(len(chunk))
 
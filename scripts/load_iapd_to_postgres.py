@@ -5,15 +5,22 @@ with robust error handling for network and encoding issues.
 
 Features:
 * Ingests Excel (.xlsx/.xls) and CSV files from local dirs or S3 URIs.
-* Skips macOS resource-fork stubs and ERA files by default.
-* Retries S3 reads on IncompleteRead, with fallbacks for CSV encodings.
-* Supports threaded loading with configurable workers.
-* Enforces SSL on RDS connections via `sslmode=require`.
+* Streams Excel worksheets (50k-row batches) and CSVs (PyArrow record batches) to bound memory,
+  overlapping parsing of the next chunk with COPY of the current one.
+* COPYs into a session-local staging table and upserts on (sec_number, filing_date),
+  so re-ingesting a file updates its filings rather than duplicating them.
+* Skips macOS resource-fork stubs, FOIA CSVs, ERA and empty files at listing time;
+  with several workers the largest files are scheduled first.
+* Retries S3 reads on IncompleteRead, with fallbacks for CSV encodings; large S3 objects
+  are spooled to a temp file instead of being held in memory.
+* Supports multi-process (or, with --threads, multi-threaded) loading with configurable workers.
+* Enforces SSL on RDS connections via `sslmode=require` (decided once per engine from the host;
+  local and Docker hosts connect without it).
 * Auto-loads credentials from .env for both AWS and Postgres.
 
 Usage
 -----
-  python3 load_iapd_to_postgres.py <SRC> [--workers N] [--include-exempt]
+  python3 load_iapd_to_postgres.py <SRC> [--workers N] [--threads] [--include-exempt] [--drop-indexes]
 
   <SRC> can be:
     • a local directory path holding .xlsx/.xls/.csv files
@@ -21,8 +28,12 @@ Usage
 
 Options
 -------
-  --workers        Number of parallel threads (default: 1)
+  --workers        Number of parallel worker processes (default: 1)
+  --threads        Run the workers as threads sharing one connection pool
+                   (suits S3 sources and CSVs, whose reads, parsing and COPY release the GIL)
   --include-exempt Include files with "exempt" in their names
+  --drop-indexes   Drop ia_filing's secondary indexes during the load and rebuild them
+                   afterwards (faster for full reloads; leave off for small incremental runs)
 
 Env vars / .env
 ---------------
@@ -38,20 +49,34 @@ AWS_REGION           AWS region
 Install dependencies
 --------------------
   pip3 install pandas openpyxl sqlalchemy psycopg2-binary tqdm python-dotenv boto3 botocore
+  pip3 install pyarrow   # optional, much faster streaming CSV parsing
+  pip3 install python-calamine   # optional, much faster Excel parsing (and .xls support)
 """
 from __future__ import annotations
-import argparse, os, sys, io
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import argparse, codecs, contextlib, functools, os, sys, tempfile
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait
 from pathlib import Path
-from typing import List, Union, Tuple
+from typing import BinaryIO, Iterable, Iterator, List, Optional, Union, Tuple
 import re
 from datetime import datetime
 
 import boto3, botocore
+import botocore.config
+from boto3.s3.transfer import TransferConfig
+import openpyxl
 import pandas as pd
 import sqlalchemy as sa
 from tqdm import tqdm
 
+from _db import get_dsn_and_engine, init_worker_engine, make_engine, split_sql_statements, worker_engine
+from _pipeline import ingest_chunks, iter_csv_chunks
+
+# Rust-backed Excel reader (optional; openpyxl is used when it isn't installed)
+try:
+    from python_calamine import CalamineWorkbook
+except ImportError:
+    CalamineWorkbook = None
+
 # Load .env
 try:
     from dotenv import load_dotenv
@@ -59,265 +84,359 @@ try:
 except ImportError:
     pass
 
-# S3 client
-s3 = boto3.client(
-    "s3",
-    aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
-    aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
-    region_name=os.getenv("AWS_REGION"),
+# S3 client: adaptive retries and short timeouts so a stalled GET is abandoned and retried
+S3_CLIENT_CONFIG = botocore.config.Config(
+    retries={"max_attempts": 10, "mode": "adaptive"},
+    connect_timeout=3,
+    read_timeout=20,
+    max_pool_connections=32,
 )
 
-# Field mapping for SEC IAPD data
-FIELD_MAPPING = {
-    'sec_number': 'SEC#',
-    'crd_number': 'Organization CRD#',
-    'firm_name': 'Primary Business Name',
-    'legal_name': 'Legal Name',
-    'sec_region': 'SEC Region',
-    'sec_status': 'SEC Current Status',
-    'sec_status_date': 'SEC Status Effective Date',
-    'raum': '5F(2)(c)',  # Regulatory Assets Under Management
-    # Client count will be calculated by summing 5D fields
-    'account_count': '5F(2)(f)',  # Number of accounts
-    'cco_name': 'Chief Compliance Officer Name',
-    'cco_phone': 'Chief Compliance Officer Telephone',
-    'cco_email': 'Chief Compliance Officer E-mail',
-    'firm_type': 'Firm Type',
-    'umbrella_registration': 'Umbrella Registration',
-    'website': 'Website Address',
-    'main_office_city': 'Main Office City',
-    'main_office_state': 'Main Office State',
-    'main_office_country': 'Main Office Country',
-}
-
-# Build DSN string and engine factory
-def get_dsn_and_engine() -> Tuple[str, sa.Engine]:
-    for var in ("PGHOST","PGDATABASE","PGUSER","PGPASSWORD"):
-        if not os.getenv(var):
-            sys.exit(f"Missing environment variable: {var}")
-    host = os.environ["PGHOST"]
-    port = os.getenv("PGPORT","5432")
-    user = os.environ["PGUSER"]
-    pwd = os.environ["PGPASSWORD"]
-    db = os.environ["PGDATABASE"]
-    dsn = f"postgresql+psycopg2://{user}:{pwd}@{host}:{port}/{db}"
-    # Use SSL only for remote connections (RDS), disable for local and Docker
-    ssl_mode = "disable" if host in ["localhost", "127.0.0.1", "postgres"] else "require"
-    engine = sa.create_engine(dsn, pool_pre_ping=True, connect_args={"sslmode": ssl_mode})
-    return dsn, engine
-
-# Extract filing date from filename
-def extract_filing_date(filename: str) -> str:
-    """Extract filing date from filename like 'ia010220.xlsx' -> '2020-01-02'"""
-    # Try 2-digit year format first (iaMMDDYY)
-    match = re.search(r'ia(\d{2})(\d{2})(\d{2})', filename)
-    if match:
-        month, day, year_2digit = match.groups()
-        # Convert 2-digit year to 4-digit (assuming 20xx for years 20-99, 19xx for 00-19)
-        year_4digit = f"20{year_2digit}" if int(year_2digit) >= 20 else f"19{year_2digit}"
-        return f"{year_4digit}-{month}-{day}"
-    
-    # Try 4-digit year format as fallback (iaMMDDYYYY)
-    match = re.search(r'ia(\d{2})(\d{2})(\d{4})', filename)
-    if match:
-        month, day, year = match.groups()
-        return f"{year}-{month}-{day}"
-    
-    return None
-
-# Count Section 11 disciplinary disclosures
-def count_disciplinary_disclosures(df: pd.DataFrame) -> int:
-    """Count Section 11 disciplinary disclosure fields"""
-    # Look for the main Section 11 column first (Y/N indicator)
-    if '11' in df.columns:
-        # Convert Y/N to 1/0
-        return (df['11'] == 'Y').astype(int)
-    
-    # Fallback: look for count columns
-    section_11_cols = [col for col in df.columns if 'Count' in col and any(x in col for x in ['11A', '11B', '11C', '11D', '11E', '11F', '11G', '11H'])]
-    if section_11_cols:
-        return df[section_11_cols].sum(axis=1).fillna(0).astype(int)
-    
-    return 0
+# Large objects are fetched as concurrent 8 MiB range GETs rather than one stream
+S3_TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=8 * 1024 * 1024,
+    multipart_chunksize=8 * 1024 * 1024,
+    max_concurrency=8,
+    use_threads=True,
+)
 
-# Normalize DataFrame
-def normalize_dataframe(df: pd.DataFrame, filename: str) -> pd.DataFrame:
-    """Normalize the DataFrame to match our database schema"""
-    df.columns = df.columns.map(str)
-    
-    # Create output DataFrame
-    out = pd.DataFrame()
-    
-    # Map fields from the source data
-    for db_field, source_field in FIELD_MAPPING.items():
-        if source_field in df.columns:
-            out[db_field] = df[source_field]
-        else:
-            out[db_field] = None
-    
-    # Extract filing date from filename
-    filing_date = extract_filing_date(filename)
-    if filing_date:
-        out['filing_date'] = filing_date
-    
-    # Convert numeric fields
-    if 'raum' in out.columns:
-        out['raum'] = pd.to_numeric(out['raum'], errors='coerce')
-    
-    # Calculate client count by summing 5D fields (5D(a)(1) through 5D(n)(1))
-    client_columns = []
-    for letter in 'abcdefghijklmn':
-        col_name = f'5D({letter})(1)'
-        if col_name in df.columns:
-            client_columns.append(col_name)
-    
-    if client_columns:
-        out['client_count'] = df[client_columns].apply(pd.to_numeric, errors='coerce').sum(axis=1)
-    else:
-        out['client_count'] = 0
-    
-    if 'account_count' in out.columns:
-        out['account_count'] = pd.to_numeric(out['account_count'], errors='coerce')
-    
-    # Convert boolean fields
-    if 'umbrella_registration' in out.columns:
-        out['umbrella_registration'] = out['umbrella_registration'].map({'Y': True, 'N': False, 'Yes': True, 'No': False})
-    
-    # Count disciplinary disclosures (Section 11)
-    out['disciplinary_disclosures'] = count_disciplinary_disclosures(df)
-    
-    # Clean up SEC number format
-    if 'sec_number' in out.columns:
-        out['sec_number'] = out['sec_number'].astype(str).str.strip()
-    
-    # Clean up CRD number format (keep as string to preserve leading zeros)
-    if 'crd_number' in out.columns:
-        out['crd_number'] = out['crd_number'].astype(str).str.strip()
-    
-    return out
+def make_s3_client():
+    return boto3.client(
+        "s3",
+        aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
+        aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
+        region_name=os.getenv("AWS_REGION"),
+        config=S3_CLIENT_CONFIG,
+    )
+
+# Built on first use, so local-disk runs never create one and each process owns its own
+_s3_client = None
+
+def get_s3():
+    global _s3_client
+    if _s3_client is None:
+        _s3_client = make_s3_client()
+    return _s3_client
+
+# Rows per DataFrame when streaming Excel worksheets
+EXCEL_BATCH_ROWS = 50_000
+
+# S3 objects downloaded ahead of the file being processed (sequential mode)
+S3_PREFETCH = 4
+
+# S3 bodies larger than this are spooled to a temp file rather than held in memory
+S3_SPOOL_BYTES = 64 * 1024 * 1024
+
+# Pool initializer: the shared per-worker engine, plus this loader's S3 client
+def _init_worker(dsn: str, use_s3: bool = False) -> None:
+    global _s3_client
+    init_worker_engine(dsn)
+    # Never reuse a client inherited over fork; for S3 runs build the worker's own
+    # client here, once, so its setup isn't charged to the first task
+    _s3_client = make_s3_client() if use_s3 else None
+
+# Section 11 item letters in a count column's name, compiled once
+_SEC11_ITEM_RE = re.compile(r'11[A-H]')
+
+# Section 11 disclosure count columns; None when the single '11' Y/N indicator column
+# is present (count_disciplinary_disclosures then uses that instead)
+def section_11_columns(columns: pd.Index) -> Optional[List[str]]:
+    if '11' in columns:
+        return None
+    names = columns.str
+    return columns[names.contains('Count', regex=False) & names.contains(_SEC11_ITEM_RE)].tolist()
+
+# Pick the CSV delimiter from the header line (files are either comma- or pipe-separated)
+def sniff_delimiter(sample: bytes) -> str:
+    header = sample.split(b"\n", 1)[0]
+    return "|" if header.count(b"|") > header.count(b",") else ","
+
+# Group worksheet rows into DataFrames; the first row is the header. dtype=object keeps
+# cell values as-is: inference would turn an int column with empty cells into float64.
+def batch_rows(rows: Iterator[tuple], batch_size: int) -> Iterator[pd.DataFrame]:
+    header = next(rows, None)
+    if header is None:
+        return
+    columns = ["" if c is None else str(c) for c in header]
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            yield pd.DataFrame(batch, columns=columns, dtype=object)
+            batch = []
+    if batch:
+        yield pd.DataFrame(batch, columns=columns, dtype=object)
+
+# calamine reports empty cells as "" and every number as float; match openpyxl's values
+# (None, and int for whole numbers) so CRD#s and phone numbers don't stringify as "123.0"
+def calamine_rows(sheet) -> Iterator[list]:
+    for row in sheet.iter_rows():
+        yield [None if v == "" else int(v) if type(v) is float and v.is_integer() else v for v in row]
+
+# Stream the first worksheet in row batches. calamine parses the sheet XML in Rust
+# (and also reads legacy .xls); openpyxl read-only mode is the pure-Python fallback.
+def iter_excel_chunks(source: Union[Path, BinaryIO], batch_size: int = EXCEL_BATCH_ROWS) -> Iterator[pd.DataFrame]:
+    if CalamineWorkbook is not None:
+        wb = CalamineWorkbook.from_object(str(source) if isinstance(source, Path) else source)
+        yield from batch_rows(calamine_rows(wb.get_sheet_by_index(0)), batch_size)
+        return
+    wb = openpyxl.load_workbook(source, read_only=True, data_only=True)
+    try:
+        yield from batch_rows(wb.worksheets[0].iter_rows(values_only=True), batch_size)
+    finally:
+        wb.close()
 
 # Read a local file
-def read_local(path: Path) -> pd.DataFrame:
+def read_local(path: Path) -> Iterator[pd.DataFrame]:
     if path.name.startswith("._"): raise RuntimeError("stub skip")
     ext = path.suffix.lower()
     if ext in (".xlsx",".xls"): 
-        return pd.read_excel(path, engine="openpyxl")
+        return iter_excel_chunks(path)
     if ext == ".csv": 
-        return pd.read_csv(path, sep=",|\\|", engine="python", encoding="utf-8")
+        with path.open("rb") as f:
+            sep = sniff_delimiter(f.readline())
+        return iter_csv_chunks(path, sep, "utf-8")
     raise ValueError(f"Unsupported file: {path}")
 
-# Read from S3 with retry and encoding fallback
-def read_s3(bucket: str, key: str) -> pd.DataFrame:
-    if Path(key).name.startswith("._"): raise RuntimeError("stub skip")
+# Check a file is valid UTF-8 in fixed-size blocks (constant memory), then rewind it
+def is_utf8(f: BinaryIO, block_size: int = 1024 * 1024) -> bool:
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    try:
+        for block in iter(lambda: f.read(block_size), b""):
+            decoder.decode(block)
+        decoder.decode(b"", final=True)
+        return True
+    except UnicodeDecodeError:
+        return False
+    finally:
+        f.seek(0)
+
+# Download an S3 object (parallel ranged GETs), retrying once on IncompleteRead. The body is
+# spooled: small objects stay in memory, large ones spill to a temp file instead of RAM.
+def fetch_s3(bucket: str, key: str) -> BinaryIO:
     for attempt in range(2):
+        body = tempfile.SpooledTemporaryFile(max_size=S3_SPOOL_BYTES)
         try:
-            resp = s3.get_object(Bucket=bucket, Key=key)
-            data = resp["Body"].read()
-            break
-        except botocore.exceptions.IncompleteRead as e:
+            get_s3().download_fileobj(bucket, key, body, Config=S3_TRANSFER_CONFIG)
+            body.seek(0)
+            return body
+        except botocore.exceptions.IncompleteRead:
+            body.close()
             if attempt==1: raise
-            data = e.partial or b""
-    buf = io.BytesIO(data)
+
+# Read a downloaded S3 object with encoding fallback; the caller owns (and closes) *body*
+def read_s3(key: str, body: BinaryIO) -> Iterator[pd.DataFrame]:
+    if Path(key).name.startswith("._"): raise RuntimeError("stub skip")
     if key.lower().endswith((".xlsx",".xls")):
-        return pd.read_excel(buf, dtype=str, engine="openpyxl")
-    try:
-        return pd.read_csv(buf, dtype=str, sep=",|\\|", engine="python", encoding="utf-8")
-    except UnicodeDecodeError:
-        buf.seek(0)
-        return pd.read_csv(buf, dtype=str, sep=",|\\|", engine="python", encoding="latin1")
+        return iter_excel_chunks(body)
+    sep = sniff_delimiter(body.read(4096))
+    body.seek(0)
+    # Decide the encoding up front: chunks are parsed lazily, so we can't retry mid-stream
+    encoding = "utf-8" if is_utf8(body) else "latin1"
+    return iter_csv_chunks(body, sep, encoding)
 
-# Ingest DataFrame into Postgres
-def ingest_df(name: str, df: pd.DataFrame, dsn: str) -> str:
-    try:
-        # For now, disable SSL completely to avoid connection issues
-        # Remove any SSL parameters from the DSN and force disable
-        dsn_clean = dsn.replace("?sslmode=require", "").replace("&sslmode=require", "")
-        engine = sa.create_engine(dsn_clean, pool_pre_ping=True, connect_args={"sslmode": "disable"})
-        
-        # Normalize the data
-        clean = normalize_dataframe(df, name)
-        
-        # Filter out rows without SEC numbers
-        clean = clean.dropna(subset=['sec_number'])
-        
-        if len(clean) == 0:
-            return f"· {name}: No valid SEC numbers found"
-        
-        # Load into database
-        clean.to_sql("ia_filing", engine, if_exists="append", index=False, method='multi')
-        return f"✓ {name}: {len(clean)} rows loaded"
-    except Exception as e:
-        return f"✗ {name}: {e}"
+# Ingest a file's DataFrame chunks into Postgres (one transaction per file)
+def ingest_df(name: str, chunks: Iterable[pd.DataFrame], engine: sa.Engine) -> str:
+    return ingest_chunks(name, chunks, engine, section_11_columns)
+
+# Files never ingested, dropped while listing so they are never opened or downloaded:
+# macOS resource-fork stubs and FOIA CSVs (they're badly formatted)
+def is_skipped(name: str) -> bool:
+    lower = name.lower()
+    return name.startswith("._") or (lower.endswith(".csv") and "foia" in lower)
+
+# Input extensions the loader understands
+SOURCE_EXTENSIONS = frozenset({"xlsx", "xls", "csv"})
 
-# Process one task (local or s3)
-def process_task(task: Tuple[str, Union[Path, Tuple[str,str]]], dsn: str) -> str:
+# One recursive scandir pass (instead of an rglob per extension); DirEntry types come
+# from the directory listing itself, so non-matching files are never stat-ed
+def walk_source_files(root: Union[str, Path]) -> Iterator[os.DirEntry]:
+    with os.scandir(root) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                yield from walk_source_files(entry.path)
+            elif entry.name.rpartition(".")[2].lower() in SOURCE_EXTENSIONS:
+                yield entry
+
+# Process one task (local or s3). *body* is an S3 download already in flight; either way
+# the spooled body is closed once the file is ingested (or fails), freeing its temp file.
+def process_task(task: Tuple[str, Union[Path, Tuple[str,str]]], engine: Optional[sa.Engine] = None,
+                 body: Optional[Future] = None) -> str:
     name, src = task
-    # ▷ Skip any FOIA CSVs (they're badly formatted and we don't ingest them)
-    if name.lower().endswith('.csv') and 'foia' in name.lower():
-        return f"· {name}: skipping FOIA file"
+    engine = engine or worker_engine()
+    s3_body: Optional[BinaryIO] = None
     try:
-        df = read_local(src) if isinstance(src, Path) else read_s3(src[0], src[1])
-        return ingest_df(name, df, dsn)
+        if isinstance(src, Path):
+            chunks = read_local(src)
+        else:
+            s3_body = body.result() if body is not None else fetch_s3(*src)
+            chunks = read_s3(src[1], s3_body)
+        return ingest_df(name, chunks, engine)
     except RuntimeError as skip:
         return f"· {name}: {skip}"
     except Exception as e:
         return f"✗ {name}: {e}"
+    finally:
+        if s3_body is not None:
+            s3_body.close()
+
+# Schema DDL, read and split once per process
+SCHEMA_FILE = Path("scripts/schema.sql")
+
+@functools.lru_cache(maxsize=1)
+def schema_statements() -> Tuple[str, ...]:
+    if not SCHEMA_FILE.exists():
+        return ()
+    return tuple(split_sql_statements(SCHEMA_FILE.read_text()))
+
+# Create tables and indexes from schema.sql. The whole script goes out as one simple-query
+# message (no bind scanning); if any DDL fails it is rolled back and replayed one statement
+# at a time, each in its own savepoint so a failing DDL is reported without undoing the rest
+def apply_schema(engine: sa.Engine) -> bool:
+    statements = schema_statements()
+    if not statements:
+        return False
+    with engine.begin() as conn:
+        try:
+            with conn.begin_nested():
+                conn.exec_driver_sql(";\n".join(statements),
+                                     execution_options={"no_parameters": True})
+            return True
+        except sa.exc.DBAPIError:
+            pass
+        for stmt in statements:
+            try:
+                with conn.begin_nested():
+                    conn.execute(sa.text(stmt))
+            except sa.exc.DBAPIError as e:
+                print(f"Warning: schema statement failed: {e.orig}")
+    return True
+
+# Secondary ia_filing indexes; UNIQUE (sec_number, filing_date) always stays, as the
+# upsert's ON CONFLICT target
+BULK_DROP_INDEXES = ("idx_ia_filing_sec_date", "idx_ia_filing_date", "idx_ia_filing_raum",
+                     "idx_ia_filing_huge_counts", "idx_ia_filing_disclosures")
+
+# With --drop-indexes, drop the secondary indexes for the duration of the load (so COPY
+# and the upserts don't maintain them row by row), then rebuild them from schema.sql
+# in one pass each and refresh planner statistics, even if the load fails
+@contextlib.contextmanager
+def secondary_indexes_dropped(engine: sa.Engine, enabled: bool) -> Iterator[None]:
+    if not enabled or not schema_statements():
+        yield
+        return
+    with engine.begin() as conn:
+        for index in BULK_DROP_INDEXES:
+            conn.execute(sa.text(f"DROP INDEX IF EXISTS {index}"))
+    try:
+        yield
+    finally:
+        print("Rebuilding ia_filing indexes...")
+        apply_schema(engine)
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(sa.text("ANALYZE ia_filing"))
 
 # Main entry
 def main():
     p = argparse.ArgumentParser()
     p.add_argument("src", help="Local dir or s3://bucket/prefix")
     p.add_argument("--workers", type=int, default=1)
+    p.add_argument("--threads", action="store_true")
     p.add_argument("--include-exempt", action="store_true")
+    p.add_argument("--drop-indexes", action="store_true")
     args = p.parse_args()
 
     dsn, engine = get_dsn_and_engine()
     
     # Create tables using the updated schema
-    with engine.begin() as conn:
-        # Read and execute the schema file
-        schema_file = Path("scripts/schema.sql")
-        if schema_file.exists():
-            with open(schema_file, 'r') as f:
-                schema_sql = f.read()
-            conn.execute(sa.text(schema_sql))
-        else:
-            print("Warning: schema.sql not found, using default schema")
+    if not apply_schema(engine):
+        print("Warning: schema.sql not found, using default schema")
 
     tasks: List[Tuple[str, Union[Path, Tuple[str,str]]]] = []
-    if args.src.lower().startswith("s3://"):
+    sizes: List[int] = []  # bytes per task, from the listing
+    is_s3 = args.src.lower().startswith("s3://")
+    if is_s3:
         _,_,rest = args.src.partition("s3://")
         bucket, prefix = rest.split("/",1)
-        paginator = s3.get_paginator("list_objects_v2")
-        for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
-            for obj in page.get("Contents",[]):
-                key = obj["Key"]
-                if not args.include_exempt and "exempt" in key.lower(): continue
-                if key.lower().endswith((".xlsx",".xls",".csv")):
-                    tasks.append((Path(key).name, (bucket, key)))
+        # Paginate past the 1000-key cap; the JMESPath search yields [key, size] per
+        # object (None for an empty page) instead of walking each page by hand
+        paginator = get_s3().get_paginator("list_objects_v2")
+        pages = paginator.paginate(Bucket=bucket, Prefix=prefix, PaginationConfig={"PageSize": 1000})
+        for obj in pages.search("Contents[].[Key, Size]"):
+            if obj is None: continue
+            key, size = obj
+            if size == 0: continue  # empty/stub object: nothing to download
+            if not args.include_exempt and "exempt" in key.lower(): continue
+            if is_skipped(Path(key).name): continue
+            if key.lower().endswith((".xlsx",".xls",".csv")):
+                tasks.append((Path(key).name, (bucket, key)))
+                sizes.append(size)
     else:
         src_dir = Path(args.src).expanduser().resolve()
         if not src_dir.is_dir(): sys.exit(f"Source dir not found: {src_dir}")
-        for ext in ("*.xlsx","*.xls","*.csv"):
-            for f in src_dir.rglob(ext):
-                if not args.include_exempt and "exempt" in f.name.lower(): continue
-                tasks.append((f.name, f))
+        for entry in walk_source_files(src_dir):
+            if not args.include_exempt and "exempt" in entry.name.lower(): continue
+            if is_skipped(entry.name): continue
+            size = entry.stat().st_size
+            if size == 0: continue  # empty/stub file: nothing to parse
+            tasks.append((entry.name, Path(entry.path)))
+            sizes.append(size)
 
     if not tasks:
         sys.exit("No files found.")
     print(f"Ingesting {len(tasks)} files with {args.workers} worker(s)...\n")
 
     if args.workers > 1:
-        with ThreadPoolExecutor(max_workers=args.workers) as pool:
-            futures = {pool.submit(process_task, t, dsn): t for t in tasks}
-            for fut in tqdm(as_completed(futures), total=len(tasks), unit="file"):
-                print(fut.result())
-    else:
-        # Process all files
-        for i, t in enumerate(tasks):
-            print(f"Processing {i+1}/{len(tasks)}: {t[0]}")
-            result = process_task(t, dsn)
-            print(result)
+        # Largest files first (longest-processing-time order), so no worker picks
+        # up a big file just as the others run out of work
+        order = sorted(range(len(tasks)), key=sizes.__getitem__, reverse=True)
+        tasks = [tasks[i] for i in order]
+
+    with secondary_indexes_dropped(engine, args.drop_indexes):
+        if args.workers > 1 and args.threads:
+            # Threads share one engine with a connection per worker: no per-process engines,
+            # S3 clients or pickling, and Arrow parsing, S3 reads and COPY all release the GIL
+            engine = make_engine(dsn, pool_size=args.workers, max_overflow=0)
+            with ThreadPoolExecutor(max_workers=args.workers) as pool, \
+                    tqdm(total=len(tasks), unit="file") as bar:
+                for fut in as_completed([pool.submit(process_task, t, engine) for t in tasks]):
+                    tqdm.write(fut.result())
+                    bar.update()
+        elif args.workers > 1:
+            # CPU-bound parsing runs in separate processes; each builds its own engine once.
+            # At most 2×workers tasks are in flight so results are drained as they finish.
+            engine.dispose()
+            max_pending = 2 * args.workers
+            with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker,
+                                     initargs=(dsn, is_s3)) as pool, \
+                    tqdm(total=len(tasks), unit="file") as bar:
+                pending = set()
+                for t in tasks:
+                    if len(pending) >= max_pending:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        for fut in done:
+                            tqdm.write(fut.result())
+                            bar.update()
+                    # Tasks are (name, Path) or (name, (bucket, key)): workers read the file themselves
+                    pending.add(pool.submit(process_task, t))
+                for fut in as_completed(pending):
+                    tqdm.write(fut.result())
+                    bar.update()
+        else:
+            # Process all files; S3 bodies for the next few tasks download on I/O threads
+            # while the current file is parsed and loaded
+            # (results go through tqdm.write so they print above the progress bar)
+            with ThreadPoolExecutor(max_workers=S3_PREFETCH) as io_pool, \
+                    tqdm(total=len(tasks), unit="file") as bar:
+                bodies = {}
+                for i, t in enumerate(tasks):
+                    for j in range(i, min(i + S3_PREFETCH + 1, len(tasks))):
+                        src_j = tasks[j][1]
+                        if j not in bodies and not isinstance(src_j, Path):
+                            bodies[j] = io_pool.submit(fetch_s3, *src_j)
+                    bar.set_postfix_str(t[0])
+                    tqdm.write(process_task(t, engine, bodies.pop(i, None)))
+                    bar.update()
 
     print("\nDone ✔")
 
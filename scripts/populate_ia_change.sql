@@ -1,9 +1,18 @@
 -- Populate ia_change table for risk scoring
 -- This script calculates change metrics between consecutive filings for each firm
 
+-- Bulk rebuild settings (scoped to this transaction)
+SET LOCAL synchronous_commit = off;
+SET LOCAL work_mem = '256MB';
+SET LOCAL maintenance_work_mem = '1GB';
+
 -- Clear existing data
 TRUNCATE TABLE ia_change;
 
+-- Drop secondary indexes during the bulk insert; they are rebuilt once at the end
+DROP INDEX IF EXISTS idx_ia_change_sec_date;
+DROP INDEX IF EXISTS idx_ia_change_date;
+
 -- Insert change data by comparing consecutive filings
 INSERT INTO ia_change (
     sec_number,
@@ -37,24 +46,24 @@ WITH filing_changes AS (
         CASE 
             WHEN f2.raum > 0 AND f1.raum < f2.raum THEN
                 CASE 
-                    WHEN ((f2.raum - f1.raum) / f2.raum) * 100 > 100 THEN 100
-                    ELSE ((f2.raum - f1.raum) / f2.raum) * 100
+                    WHEN ((f2.raum - f1.raum)::double precision / f2.raum) * 100 > 100 THEN 100
+                    ELSE ((f2.raum - f1.raum)::double precision / f2.raum) * 100
                 END
             ELSE 0
         END as raum_drop_pct,
         CASE 
             WHEN f2.client_count > 0 AND f1.client_count < f2.client_count THEN
                 CASE 
-                    WHEN ((f2.client_count - f1.client_count) / f2.client_count) * 100 > 100 THEN 100
-                    ELSE ((f2.client_count - f1.client_count) / f2.client_count) * 100
+                    WHEN ((f2.client_count - f1.client_count)::double precision / f2.client_count) * 100 > 100 THEN 100
+                    ELSE ((f2.client_count - f1.client_count)::double precision / f2.client_count) * 100
                 END
             ELSE 0
         END as client_drop_pct,
         CASE 
             WHEN f2.account_count IS NOT NULL AND f2.account_count > 0 AND f1.account_count IS NOT NULL THEN
                 CASE 
-                    WHEN ((f2.account_count - f1.account_count) / f2.account_count) * 100 > 100 THEN 100
-                    ELSE ((f2.account_count - f1.account_count) / f2.account_count) * 100
+                    WHEN ((f2.account_count - f1.account_count)::double precision / f2.account_count) * 100 > 100 THEN 100
+                    ELSE ((f2.account_count - f1.account_count)::double precision / f2.account_count) * 100
                 END
             ELSE 0
         END as acct_drop_pct,
@@ -100,13 +109,11 @@ trend_analysis AS (
         adviser_age_years,
         raum,
         -- Calculate trend down flag (7% average decline over last 3 periods)
-        CASE 
-            WHEN (raum_drop_pct + 
-                  COALESCE(LAG(raum_drop_pct, 1) OVER (PARTITION BY sec_number ORDER BY filing_date), 0) +
-                  COALESCE(LAG(raum_drop_pct, 2) OVER (PARTITION BY sec_number ORDER BY filing_date), 0)) / 3 >= 7
-            THEN TRUE
-            ELSE FALSE
-        END as trend_down_flag,
+        -- (single window frame; missing earlier periods count as 0)
+        SUM(raum_drop_pct) OVER (
+            PARTITION BY sec_number ORDER BY filing_date
+            ROWS BETWEEN 2 PRECEDING AND CURRENT ROW
+        ) / 3 >= 7 as trend_down_flag,
         -- For now, set owner_moves_12m to 0 (would need additional data)
         0 as owner_moves_12m
     FROM filing_changes
@@ -126,6 +133,10 @@ SELECT
 FROM trend_analysis
 WHERE filing_date IS NOT NULL;
 
+-- Rebuild secondary indexes in one pass each
+CREATE INDEX IF NOT EXISTS idx_ia_change_sec_date ON ia_change(sec_number, filing_date);
+CREATE INDEX IF NOT EXISTS idx_ia_change_date ON ia_change(filing_date);
+
 -- Log the results
 DO $$
 BEGIN
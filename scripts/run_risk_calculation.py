@@ -21,6 +21,8 @@ from datetime import datetime
 import sqlalchemy as sa
 from sqlalchemy import text
 
+from _db import KEEPALIVE_ARGS
+
 # Load environment variables
 try:
     from dotenv import load_dotenv
@@ -42,7 +44,9 @@ def get_database_connection() -> sa.Engine:
     db = os.environ["PGDATABASE"]
     
     dsn = f"postgresql+psycopg2://{user}:{pwd}@{host}:{port}/{db}"
-    return sa.create_engine(dsn, pool_pre_ping=True)
+    # No pool_pre_ping: this short run checks out a fresh connection, so the extra
+    # SELECT 1 per checkout is pure overhead; keepalives catch a dead peer instead
+    return sa.create_engine(dsn, connect_args=KEEPALIVE_ARGS)
 
 def execute_risk_calculation(engine: sa.Engine, dry_run: bool = False) -> dict:
     """Execute the risk score calculation procedure."""
@@ -61,7 +65,7 @@ def execute_risk_calculation(engine: sa.Engine, dry_run: bool = False) -> dict:
             
             # Get statistics after calculation
             stats_result = conn.execute(text("SELECT * FROM get_risk_statistics()"))
-            stats = [dict(row) for row in stats_result]
+            stats = stats_result.mappings().all()
             
             end_time = datetime.now()
             duration = (end_time - start_time).total_seconds()
@@ -84,31 +88,40 @@ def execute_risk_calculation(engine: sa.Engine, dry_run: bool = False) -> dict:
             "message": f"Risk calculation failed after {duration:.2f} seconds: {str(e)}"
         }
 
+SUMMARY_QUERY = """
+SELECT t.total, t.latest, s.risk_category, s.firm_count, s.percentage, s.avg_score
+FROM (SELECT COUNT(*) AS total, MAX(updated_at) AS latest FROM ia_risk_score) t
+LEFT JOIN get_risk_statistics() WITH ORDINALITY
+    AS s(risk_category, firm_count, percentage, avg_score, ord) ON true
+ORDER BY s.ord
+"""
+
 def get_risk_summary(engine: sa.Engine) -> dict:
     """Get a summary of current risk scores."""
     try:
         with engine.connect() as conn:
-            # Get total count
-            count_result = conn.execute(text("SELECT COUNT(*) as total FROM ia_risk_score"))
-            total_count = count_result.scalar()
-            
-            # Get latest calculation date
-            date_result = conn.execute(text("SELECT MAX(updated_at) as latest FROM ia_risk_score"))
-            latest_date = date_result.scalar()
-            
-            # Get risk distribution
-            stats_result = conn.execute(text("SELECT * FROM get_risk_statistics()"))
-            stats = [dict(row) for row in stats_result]
+            # Total count, latest calculation date and risk distribution in one round
+            # trip; the LEFT JOIN keeps the totals row when there is no distribution yet
+            rows = conn.execute(text(SUMMARY_QUERY)).mappings().all()
             
             return {
-                "total_firms": total_count,
-                "latest_calculation": latest_date,
-                "risk_distribution": stats
+                "total_firms": rows[0]["total"],
+                "latest_calculation": rows[0]["latest"],
+                "risk_distribution": [row for row in rows if row["risk_category"] is not None]
             }
             
     except Exception as e:
         return {"error": str(e)}
 
+def print_risk_statistics(stats) -> None:
+    """Print get_risk_statistics() rows as one block of text."""
+    if not stats:
+        return
+    print("\n".join(
+        f"  {stat['risk_category']}: {stat['firm_count']} firms ({stat['percentage']}%) - Avg Score: {stat['avg_score']}"
+        for stat in stats
+    ))
+
 def main():
     parser = argparse.ArgumentParser(description="Execute risk score calculation using SQL procedure")
     parser.add_argument("--dry-run", action="store_true", help="Show what would be executed without running")
@@ -132,8 +145,7 @@ def main():
         print(f"Latest calculation: {summary['latest_calculation']}")
         print(f"\nRisk Distribution:")
         
-        for stat in summary['risk_distribution']:
-            print(f"  {stat['risk_category']}: {stat['firm_count']} firms ({stat['percentage']}%) - Avg Score: {stat['avg_score']}")
+        print_risk_statistics(summary['risk_distribution'])
         
         return
     
@@ -145,8 +157,7 @@ def main():
         
         if args.verbose and "statistics" in result:
             print(f"\nRisk Score Statistics:")
-            for stat in result["statistics"]:
-                print(f"  {stat['risk_category']}: {stat['firm_count']} firms ({stat['percentage']}%) - Avg Score: {stat['avg_score']}")
+            print_risk_statistics(result["statistics"])
     
     elif result["status"] == "error":
         print(f"❌ {result['message']}")
@@ -7,6 +7,8 @@ import sys
 import sqlalchemy as sa
 from pathlib import Path
 
+from _db import ssl_mode_for
+
 def get_dsn_and_engine():
     """Get database connection string and engine"""
     for var in ("PGHOST","PGDATABASE","PGUSER","PGPASSWORD"):
@@ -20,9 +22,10 @@ def get_dsn_and_engine():
     db = os.environ["PGDATABASE"]
     
     dsn = f"postgresql+psycopg2://{user}:{pwd}@{host}:{port}/{db}"
-    # Use SSL only for remote connections, disable for local and Docker
-    ssl_mode = "disable" if host in ["localhost", "127.0.0.1", "postgres"] else "require"
-    engine = sa.create_engine(dsn, pool_pre_ping=True, connect_args={"sslmode": ssl_mode})
+    # Use SSL only for remote connections, disable for local and Docker.
+    # No pool_pre_ping: every step shares one freshly opened connection, so a
+    # liveness probe would only add a round trip per step.
+    engine = sa.create_engine(dsn, connect_args={"sslmode": ssl_mode_for(host)})
     return dsn, engine
 
 def read_sql_file(file_path):
@@ -30,11 +33,11 @@ def read_sql_file(file_path):
     with open(file_path, 'r') as f:
         return f.read()
 
-def execute_sql_script(engine, script_name, sql_content):
-    """Execute SQL script and handle errors"""
+def execute_sql_script(conn, script_name, sql_content):
+    """Execute SQL script in its own transaction and handle errors"""
     try:
         print(f"📋 Executing {script_name}...")
-        with engine.begin() as conn:
+        with conn.begin():
             conn.execute(sa.text(sql_content))
         print(f"✅ {script_name} completed successfully")
         return True
@@ -57,32 +60,33 @@ def main():
         ("risk_score_procedure_fixed.sql", scripts_dir / "risk_score_procedure_fixed.sql"),
     ]
     
-    # Execute each script
+    # Execute each script, then the CALL, over a single connection
     success_count = 0
-    for script_name, script_path in sql_scripts:
-        if not script_path.exists():
-            print(f"⚠️  Script not found: {script_path}")
-            continue
-            
-        sql_content = read_sql_file(script_path)
-        if execute_sql_script(engine, script_name, sql_content):
-            success_count += 1
-    
-    print(f"\n📊 Summary: {success_count}/{len(sql_scripts)} scripts executed successfully")
-    
-    if success_count == len(sql_scripts):
-        print("🎉 All SQL procedures completed successfully!")
-        
-        # Run the risk calculation procedure
-        print("\n🔢 Running risk score calculation...")
-        try:
-            with engine.begin() as conn:
-                conn.execute(sa.text("CALL calc_risk_scores();"))
-            print("✅ Risk scores calculated successfully!")
-        except Exception as e:
-            print(f"❌ Error calculating risk scores: {e}")
-    else:
-        print("⚠️  Some scripts failed. Please check the errors above.")
+    with engine.connect() as conn:
+        for script_name, script_path in sql_scripts:
+            if not script_path.exists():
+                print(f"⚠️  Script not found: {script_path}")
+                continue
+
+            sql_content = read_sql_file(script_path)
+            if execute_sql_script(conn, script_name, sql_content):
+                success_count += 1
+
+        print(f"\n📊 Summary: {success_count}/{len(sql_scripts)} scripts executed successfully")
+
+        if success_count == len(sql_scripts):
+            print("🎉 All SQL procedures completed successfully!")
+
+            # Run the risk calculation procedure
+            print("\n🔢 Running risk score calculation...")
+            try:
+                with conn.begin():
+                    conn.execute(sa.text("CALL calc_risk_scores();"))
+                print("✅ Risk scores calculated successfully!")
+            except Exception as e:
+                print(f"❌ Error calculating risk scores: {e}")
+        else:
+            print("⚠️  Some scripts failed. Please check the errors above.")
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
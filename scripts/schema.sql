@@ -44,6 +44,26 @@ CREATE TABLE IF NOT EXISTS ia_filing (
 CREATE INDEX IF NOT EXISTS idx_ia_filing_sec_date ON ia_filing(sec_number, filing_date);
 CREATE INDEX IF NOT EXISTS idx_ia_filing_date ON ia_filing(filing_date);
 CREATE INDEX IF NOT EXISTS idx_ia_filing_raum ON ia_filing(raum);
+-- Tiny partial index covering only implausibly large client/account counts (diagnostic
+-- queries). Negative counts are not indexed: the loaders store them as NULL and the CHECK
+-- below rejects them from any other writer. Replaces idx_ia_filing_anomalies, whose
+-- predicate also matched negatives.
+DROP INDEX IF EXISTS idx_ia_filing_anomalies;
+CREATE INDEX IF NOT EXISTS idx_ia_filing_huge_counts ON ia_filing(client_count, account_count)
+    WHERE client_count > 1000000 OR account_count > 1000000;
+-- Partial index over the minority of filings with disclosures (top-N and disclosure diagnostics)
+CREATE INDEX IF NOT EXISTS idx_ia_filing_disclosures ON ia_filing(disciplinary_disclosures)
+    WHERE disciplinary_disclosures > 0;
+
+-- Reject negative counts on new rows (NOT VALID skips re-checking existing data); the
+-- loaders already turn negative source counts into NULL, so this only guards other writers
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'ia_filing_counts_non_negative') THEN
+        ALTER TABLE ia_filing ADD CONSTRAINT ia_filing_counts_non_negative
+            CHECK (client_count >= 0 AND account_count >= 0) NOT VALID;
+    END IF;
+END $$;
 
 -- Create the change tracking table for risk calculation
 CREATE TABLE IF NOT EXISTS ia_change (
@@ -4,7 +4,7 @@ unzip_iapd_zips.py – Extract every ZIP file downloaded by fetch_iapd_data.py
 
 Usage
 -----
-    python3 unzip_iapd_zips.py [ZIP_DIR] [OUT_DIR]
+    python3 unzip_iapd_zips.py [ZIP_DIR] [OUT_DIR] [--workers N]
 
 • *ZIP_DIR*  : directory that holds the .zip archives (default: ./data/raw/iapd)
 • *OUT_DIR*  : where to extract `.xlsx` files        (default: ./data/unzipped/iapd)
@@ -13,6 +13,8 @@ The script:
 1. Recursively walks *ZIP_DIR* for any `*.zip` file.
 2. Creates *OUT_DIR* (and sub‑folders) if needed.
 3. Skips extraction if the target .xlsx already exists.
+4. Extracts several archives at once (zlib releases the GIL while inflating), streaming
+   each member to disk through a 1 MiB buffer.
 
 Dependencies
 ------------
@@ -24,8 +26,12 @@ Install tqdm for a progress bar:
 from __future__ import annotations
 
 import argparse
+import os
+import shutil
 import sys
+import threading
 import zipfile
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import List
 
@@ -34,6 +40,9 @@ try:
 except ModuleNotFoundError:  # fallback – no progress bar
     tqdm = lambda x, **_: x  # noqa: E731
 
+# Copy buffer: only this much of a member is held in memory at a time
+COPY_BUFFER_BYTES = 1 << 20
+
 
 def find_zip_files(zip_dir: Path) -> List[Path]:
     """Return a list of all .zip files under *zip_dir* (recursive)."""
@@ -41,28 +50,54 @@ def find_zip_files(zip_dir: Path) -> List[Path]:
 
 
 def extract_zip(zip_path: Path, out_dir: Path) -> None:
-    """Extract *zip_path* into *out_dir*, skipping any existing XLSX."""
+    """Extract *zip_path*'s Excel/CSV members into *out_dir*, skipping existing files.
+
+    Members are streamed from the decompressor to disk in COPY_BUFFER_BYTES blocks,
+    so memory stays flat however large the member (and however many run at once).
+    """
     with zipfile.ZipFile(zip_path) as zf:
-        members = [m for m in zf.namelist() if m.lower().endswith(('.xlsx', '.xls', '.csv'))]
+        # One pass over the central directory; the ZipInfo objects are opened directly
+        # (macOS resource-fork stubs like __MACOSX/._x.xlsx are never extracted)
+        members = [
+            info for info in zf.infolist()
+            if info.filename.lower().endswith(('.xlsx', '.xls', '.csv'))
+            and not Path(info.filename).name.startswith("._")
+        ]
         if not members:
             print(f"! {zip_path.name}: no Excel/CSV found – skipped")
             return
 
+        out_dir.mkdir(parents=True, exist_ok=True)
         for member in members:
-            dest_path = out_dir / Path(member).name
+            dest_path = out_dir / Path(member.filename).name
             if dest_path.exists():
                 print(f"✓ {dest_path.name} exists – skipping")
                 continue
-            dest_path.parent.mkdir(parents=True, exist_ok=True)
             print(f"→ {dest_path.name} … extracting")
-            with zf.open(member) as src, dest_path.open("wb") as dst:
-                dst.write(src.read())
+            # Write to a per-thread part file and rename it into place, so an interrupted
+            # run never leaves a truncated file that a re-run would skip as extracted
+            part_path = dest_path.with_name(f".{dest_path.name}.{threading.get_ident()}.part")
+            try:
+                with zf.open(member) as src, part_path.open("wb") as dst:
+                    shutil.copyfileobj(src, dst, length=COPY_BUFFER_BYTES)
+                os.replace(part_path, dest_path)
+            finally:
+                part_path.unlink(missing_ok=True)
+
+
+def extract_zip_safe(zip_path: Path, out_dir: Path) -> None:
+    """Like extract_zip, but report a corrupt archive instead of raising."""
+    try:
+        extract_zip(zip_path, out_dir)
+    except zipfile.BadZipFile as exc:
+        print(f"✗ {zip_path.name}: Bad ZIP ({exc}) – skipped")
 
 
 def main() -> None:
     parser = argparse.ArgumentParser(description="Extract SEC IAPD ZIP archives")
     parser.add_argument("zip_dir", nargs="?", default="data/raw/iapd", help="Directory containing ZIP files (default: %(default)s)")
     parser.add_argument("out_dir", nargs="?", default="data/unzipped/iapd", help="Directory to place extracted files (default: %(default)s)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Archives extracted in parallel (default: %(default)s)")
     args = parser.parse_args()
 
     zip_dir = Path(args.zip_dir).expanduser().resolve()
@@ -79,11 +114,10 @@ def main() -> None:
 
     print(f"Found {len(zip_files)} ZIP files – extracting to {out_dir}\n")
 
-    for zf in tqdm(zip_files, desc="ZIPs", unit="file"):
-        try:
-            extract_zip(zf, out_dir)
-        except zipfile.BadZipFile as exc:
-            print(f"✗ {zf.name}: Bad ZIP ({exc}) – skipped")
+    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as pool:
+        jobs = pool.map(lambda zp: extract_zip_safe(zp, out_dir), zip_files)
+        for _ in tqdm(jobs, total=len(zip_files), desc="ZIPs", unit="file"):
+            pass
 
     print("\nAll done ✔ – extracted files live in", out_dir)
 
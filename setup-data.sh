@@ -9,14 +9,12 @@ mkdir -p data/raw/iapd
 echo "📦 Starting Docker containers..."
 docker-compose up -d
 
-# Wait for PostgreSQL to be ready
+# Wait for PostgreSQL to be ready: poll pg_isready (a cheap connection probe) right away
+# instead of sleeping a fixed 10s first
 echo "⏳ Waiting for PostgreSQL to be ready..."
-sleep 10
-
-# Check if PostgreSQL is ready
-until docker-compose exec -T postgres pg_isready -U iapdadmin -d iapd; do
+until docker-compose exec -T postgres pg_isready -q -U iapdadmin -d iapd; do
     echo "Waiting for PostgreSQL..."
-    sleep 2
+    sleep 1
 done
 
 echo "✅ PostgreSQL is ready!"
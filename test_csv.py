@@ -1,31 +1,46 @@
 #!/usr/bin/env python3
+import codecs
+import importlib.util
 import pandas as pd
 from pathlib import Path
 
+# Arrow's multi-threaded CSV parser when installed (the separator and encoding are always
+# given explicitly, which it needs)
+ARROW = {"engine": "pyarrow"} if importlib.util.find_spec("pyarrow") else {}
+
 # Test reading one CSV file
 csv_file = Path("data/unzipped/iapd/ia010322.csv")
 
 print(f"Testing CSV file: {csv_file}")
 print(f"File exists: {csv_file.exists()}")
 
-# Try different approaches
-approaches = [
-    ("Simple comma", {"sep": ","}),
-    ("Simple pipe", {"sep": "|"}),
-    ("Comma with latin-1", {"sep": ",", "encoding": "latin1"}),
-    ("Pipe with latin-1", {"sep": "|", "encoding": "latin1"}),
-    ("Auto-detect", {"sep": None, "encoding": "latin1"}),
-]
+def sniff_delimiter(header):
+    """IAPD CSVs are either comma- or pipe-separated; pick whichever the header uses more"""
+    return "|" if header.count(b"|") > header.count(b",") else ","
 
-for name, params in approaches:
+def detect_encoding(path, block_size=1024 * 1024):
+    """utf-8 if the whole file decodes as UTF-8 (checked block by block), else latin-1"""
+    decoder = codecs.getincrementaldecoder("utf-8")()
     try:
-        print(f"\nTrying {name}...")
-        df = pd.read_csv(csv_file, **params)
-        print(f"✅ Success with {name}")
-        print(f"Shape: {df.shape}")
-        print(f"Columns: {list(df.columns)[:5]}...")
-        print(f"First few rows:")
-        print(df.head(2))
-        break
-    except Exception as e:
-        print(f"❌ Failed with {name}: {str(e)[:100]}...") 
\ No newline at end of file
+        with path.open("rb") as f:
+            for block in iter(lambda: f.read(block_size), b""):
+                decoder.decode(block)
+        decoder.decode(b"", final=True)
+        return "utf-8"
+    except UnicodeDecodeError:
+        return "latin1"
+
+# Probe the separator and encoding up front, then parse the file once
+try:
+    with csv_file.open("rb") as f:
+        sep = sniff_delimiter(f.readline())
+    encoding = detect_encoding(csv_file)
+    print(f"\nDetected separator {sep!r}, encoding {encoding}")
+    df = pd.read_csv(csv_file, sep=sep, encoding=encoding, **ARROW)
+    print(f"✅ Success")
+    print(f"Shape: {df.shape}")
+    print(f"Columns: {list(df.columns)[:5]}...")
+    print(f"First few rows:")
+    print(df.head(2))
+except Exception as e:
+    print(f"❌ Failed: {str(e)[:100]}...")
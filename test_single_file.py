@@ -1,7 +1,25 @@
 #!/usr/bin/env python3
+import contextlib
+import importlib.util
+import io
+import os
 import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
+# Rust-based calamine for .xlsx and Arrow's multi-threaded parser for CSVs when installed
+EXCEL_ENGINE = "calamine" if importlib.util.find_spec("python_calamine") else "openpyxl"
+CSV_OPTIONS = {"engine": "pyarrow"} if importlib.util.find_spec("pyarrow") else {"low_memory": False}
+
+def read_excel_fast(path):
+    """Read the first sheet with calamine, falling back to openpyxl if calamine can't parse it"""
+    if EXCEL_ENGINE == "calamine":
+        try:
+            return pd.read_excel(path, engine="calamine", dtype=str)
+        except Exception as e:
+            print(f"   calamine failed ({e}), retrying with openpyxl")
+    return pd.read_excel(path, engine="openpyxl", dtype=str)
+
 # Test a few different files to see what's in them
 test_files = [
     "data/unzipped/iapd/ia010220.xlsx",  # 2020 file
@@ -9,31 +27,45 @@ test_files = [
     "data/unzipped/iapd/ia010324.xlsx",  # 2024 file
 ]
 
-for file_path in test_files:
+def inspect_file(file_path):
+    """Inspect one file and return the report (printed by the parent, so reports don't interleave)"""
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        _inspect_file(file_path)
+    return out.getvalue()
+
+def _inspect_file(file_path):
     path = Path(file_path)
     print(f"\n=== Testing {path.name} ===")
     
     if not path.exists():
         print(f"❌ File does not exist: {path}")
-        continue
-        
+        return
+    
     try:
+        # Only the layout is inspected, so every column is read as text (no dtype inference)
         if path.suffix.lower() == '.csv':
-            df = pd.read_csv(path, sep=",", encoding="latin1", low_memory=False, on_bad_lines='skip')
+            df = pd.read_csv(path, sep=",", encoding="latin1", on_bad_lines='skip', dtype=str, **CSV_OPTIONS)
         else:
-            df = pd.read_excel(path, engine='openpyxl')
-            
+            df = read_excel_fast(path)
+        
         print(f"✅ Successfully read {path.name}")
         print(f"   Shape: {df.shape}")
         print(f"   Columns: {list(df.columns)[:5]}...")
-        
+    
         # Check if there's a date column
         date_columns = [col for col in df.columns if 'date' in col.lower()]
         print(f"   Date columns: {date_columns}")
-        
+    
         # Show first few rows
         print(f"   First few rows:")
         print(df.head(2).to_string())
-        
+    
     except Exception as e:
-        print(f"❌ Error reading {path.name}: {e}") 
\ No newline at end of file
+        print(f"❌ Error reading {path.name}: {e}")
+
+if __name__ == "__main__":
+    # Each file is parsed in its own process; reports print in the original order
+    with ProcessPoolExecutor(max_workers=min(len(test_files), os.cpu_count() or 1)) as pool:
+        for report in pool.map(inspect_file, test_files):
+            print(report, end="")